@@ -1,7 +1,7 @@
+import argparse
 import numpy as np
 import sys
 import pathlib
-import os
 
 TICK_SKIP = 8
 HALF_LIFE_SECONDS = 5
@@ -10,50 +10,197 @@ fps = 120 / TICK_SKIP
 gamma = np.exp(np.log(0.5) / (fps * HALF_LIFE_SECONDS))
 
 _path = pathlib.Path(__file__).parent.resolve()
-sys.path.append(_path)
-
-def process_player_data(file_path, episodesBackInTime = 20):
-    rewards_episodes = []
-    current_episode = []
-    
-    full_path = str(_path) + "/" + file_path
-
-    if(os.path.exists(full_path) == False):
-        print(F"File '{file_path}' does not exist. Exiting...")
-        exit()
-
-    with open(full_path, "r") as f:
-        for line in f:
-            if line == "DONE\n":
-                rewards_episodes.append(current_episode[-episodesBackInTime:-1])
-                current_episode = []
-            else:
-                current_episode.append(float(line))
-
-    returns_episodes = []
-    current_episode = []
-
-    for episode in rewards_episodes:
-        returns = 0
-        for reward in reversed(episode):
-            current_episode.append(returns * gamma + reward)
-        returns_episodes.append(list(reversed(current_episode)))
-
-    episode_avgs = [np.mean(episode) for episode in returns_episodes]
-    total_avg_player = np.mean(episode_avgs)
-
-    if(file_path == 'dataFirstPlayer.txt'):
-        print(F"Number of episodes: {len(episode_avgs)}")
-
-    return total_avg_player
-
-episodesBackInTime = 10
-total_avg_first_player = process_player_data("dataFirstPlayer.txt", episodesBackInTime)
-total_avg_second_player = process_player_data("dataSecondPlayer.txt", episodesBackInTime)
-
-print("-------------------------")
-print(F"Episodes back in time: {str(episodesBackInTime)}")
-print(F"Total avg for first player: {total_avg_first_player}")
-print(F"Total avg for second player: {total_avg_second_player}")
-print("-------------------------")
-print(F"Final mean: {(total_avg_first_player + total_avg_second_player) / 2}")
+sys.path.append(str(_path))
+sys.path.append(str(_path / "src"))
+
+from reward_log import MAGIC, read_reward_log
+
+DEFAULT_FILES = ["dataFirstPlayer.bin", "dataSecondPlayer.bin"]
+CHUNK_SIZE = 1 << 24 # Bytes read from the log at once
+
+def read_reward_chunks(file_path, chunk_size = CHUNK_SIZE):
+    """
+    Streams a text reward log (one reward per line, "DONE" after the last reward of an episode) as float64 arrays
+    in which every DONE marker is a NaN. Chunks always end at a line boundary.
+    """
+    remainder = b""
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            last_newline = chunk.rfind(b"\n")
+            if last_newline == -1:
+                remainder = chunk
+                continue
+            remainder = chunk[last_newline + 1:]
+            yield _parse_lines(chunk[:last_newline + 1])
+
+    if remainder.strip():
+        yield _parse_lines(remainder)
+
+def _parse_lines(data):
+    return np.array(data.replace(b"DONE", b"nan").split()).astype(np.float64)
+
+def read_binary_reward_chunks(file_path, player = None, chunk_size = CHUNK_SIZE):
+    """
+    Streams the rewards of a binary reward log (see src/reward_log.py) in the same layout as read_reward_chunks,
+    i.e. with a NaN after the record that ended each episode. Only the records of `player` are kept if given.
+    """
+    records = read_reward_log(file_path)
+    chunk_records = max(1, chunk_size // records.dtype.itemsize)
+    for start in range(0, len(records), chunk_records):
+        chunk = records[start:start + chunk_records]
+        if player is not None:
+            chunk = chunk[chunk["player"] == player]
+        done = np.flatnonzero(chunk["done"])
+        yield np.insert(chunk["reward"], done + 1, np.nan)
+
+def is_binary_log(file_path):
+    with open(file_path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def reward_series(file_path):
+    """
+    Returns a (name, player) pair for every reward series in a log: one per player for binary logs, a single one
+    with a None player for text logs.
+    """
+    if not is_binary_log(file_path):
+        return [(None, None)]
+    players = np.unique(read_reward_log(file_path)["player"])
+    if len(players) <= 1:
+        return [(None, None if len(players) == 0 else int(players[0]))]
+    return [(F"player {player}", int(player)) for player in players]
+
+def episode_windows(values, episodesBackInTime, with_final = False):
+    """
+    Returns the [start, stop) indices into `values` of the rewards kept for every complete episode, i.e. the same
+    window as `episode[-episodesBackInTime:-1]`, plus the index where the trailing incomplete episode starts. With
+    `with_final`, the final reward is kept at the end of the window.
+    """
+    done = np.flatnonzero(np.isnan(values))
+    begins = np.concatenate(([0], done[:-1] + 1))
+    stops = done if with_final else done - 1 # The last reward of the episode (the final reward) is left out
+    if episodesBackInTime > 0:
+        starts = np.maximum(done - episodesBackInTime, begins)
+    else:
+        starts = begins
+    stops = np.maximum(stops, starts)
+    tail = done[-1] + 1 if len(done) > 0 else 0
+    return starts, stops, tail
+
+def discounted_returns(values, starts, stops, gamma = gamma):
+    """
+    Discounted returns of every window, computed with a reverse scan over a (n_episodes, max_length) matrix padded
+    with zeros after the end of each episode, so every column is updated for all the episodes at once.
+
+    :return: The returns matrix and the mask of its valid entries.
+    """
+    lengths = stops - starts
+    max_length = int(lengths.max()) if len(lengths) > 0 else 0
+    columns = np.arange(max_length)
+    mask = columns < lengths[:, None]
+    indices = np.where(mask, starts[:, None] + columns, 0)
+    rewards = np.where(mask, values[indices], 0.0)
+
+    returns = np.empty_like(rewards)
+    running = np.zeros(len(rewards))
+    for t in reversed(range(max_length)):
+        running *= gamma
+        running += rewards[:, t]
+        returns[:, t] = running
+    return returns, mask
+
+def process_player_data(file_path, episodesBackInTime = 20, gamma = gamma, chunk_size = CHUNK_SIZE, player = None):
+    """
+    Streams a text or binary reward log, restricted to the records of `player` if given, and returns, for every
+    complete episode, its length and its mean and initial discounted return. Episodes whose window is empty are
+    reported with a length of 0 and NaN returns.
+    """
+    lengths, means, initial_returns = [], [], []
+    carry = np.empty(0)
+    if is_binary_log(file_path):
+        chunks = read_binary_reward_chunks(file_path, player, chunk_size)
+    else:
+        chunks = read_reward_chunks(file_path, chunk_size)
+    for chunk in chunks:
+        values = np.concatenate((carry, chunk))
+        starts, stops, tail = episode_windows(values, episodesBackInTime)
+        carry = values[tail:]
+        if len(starts) == 0:
+            continue
+
+        returns, mask = discounted_returns(values, starts, stops, gamma)
+        episode_lengths = mask.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            episode_means = returns.sum(axis=1) / episode_lengths
+        first_returns = returns[:, 0] if returns.shape[1] > 0 else np.zeros(len(returns))
+
+        lengths.append(episode_lengths)
+        means.append(episode_means)
+        initial_returns.append(np.where(episode_lengths > 0, first_returns, np.nan))
+
+    if len(lengths) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+    return np.concatenate(lengths), np.concatenate(means), np.concatenate(initial_returns)
+
+def summarize(episode_means):
+    valid = episode_means[~np.isnan(episode_means)]
+    if len(valid) == 0:
+        return {"episodes": 0, "mean": np.nan, "std": np.nan, "min": np.nan, "p50": np.nan, "p95": np.nan, "max": np.nan}
+    return {
+        "episodes": len(valid),
+        "mean": valid.mean(),
+        "std": valid.std(),
+        "min": valid.min(),
+        "p50": np.percentile(valid, 50),
+        "p95": np.percentile(valid, 95),
+        "max": valid.max(),
+    }
+
+def format_summary(name, stats):
+    return (F"{name}: episodes={stats['episodes']} mean={stats['mean']:.6f} std={stats['std']:.6f} "
+            F"min={stats['min']:.6f} p50={stats['p50']:.6f} p95={stats['p95']:.6f} max={stats['max']:.6f}")
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Discounted returns of the reward logs written by the bot, used to choose finalUpperBound.")
+    parser.add_argument("files", nargs="*", default=DEFAULT_FILES, help="Text or binary reward logs, relative to this folder (default: %(default)s)")
+    parser.add_argument("--back", type=int, default=10, help="Rewards kept at the end of every episode, the final reward excluded (0 keeps the whole episode)")
+    parser.add_argument("--tick-skip", type=int, default=TICK_SKIP)
+    parser.add_argument("--half-life", type=float, default=HALF_LIFE_SECONDS, help="Half life of the discount, in seconds")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Bytes read from a log at once")
+    parser.add_argument("--per-episode", action="store_true", help="Also print the statistics of every episode")
+    args = parser.parse_args(argv)
+
+    episode_gamma = np.exp(np.log(0.5) / (120 / args.tick_skip * args.half_life))
+
+    file_means = []
+    all_means = []
+    for file_path in args.files:
+        full_path = _path / file_path
+        if not full_path.exists():
+            print(F"File '{file_path}' does not exist. Exiting...")
+            sys.exit(1)
+
+        for series_name, player in reward_series(full_path):
+            name = file_path if series_name is None else F"{file_path} ({series_name})"
+            lengths, means, initial_returns = process_player_data(full_path, args.back, episode_gamma, args.chunk_size, player)
+            stats = summarize(means)
+            file_means.append(stats["mean"])
+            all_means.append(means)
+
+            print(format_summary(name, stats))
+            if args.per_episode:
+                for i, (length, mean, initial) in enumerate(zip(lengths, means, initial_returns)):
+                    print(F"  episode {i}: length={length} mean_return={mean:.6f} initial_return={initial:.6f}")
+
+    print("-------------------------")
+    print(F"Episodes back in time: {args.back}")
+    print(F"Gamma: {episode_gamma}")
+    print(format_summary("All episodes", summarize(np.concatenate(all_means))))
+    print("-------------------------")
+    print(F"Final mean: {np.nanmean(file_means) if len(file_means) > 0 else np.nan}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Micro-benchmarks of the bot environment components against synthetic game states, for 1v1, 2v2 and 3v3, and of the
+training environment components (obs_builder.py, reward.py and action_parser.py at the root of the repo) when
+rlgym_sim is installed.
+
+    python benchmarks/bench_components.py --save-baseline   # store the reference numbers of this machine
+    python benchmarks/bench_components.py                   # compare against them, exits with 1 on a regression
+
+Every case reports the operations per second (one operation processes every player of the state once) and the
+peak memory allocated by one operation, as traced by tracemalloc.
+"""
+import argparse
+import json
+import pathlib
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+_path = pathlib.Path(__file__).parent.resolve()
+sys.path.append(str(_path.parent / "src"))
+sys.path.append(str(_path.parent.parent)) # Training environment, only imported by make_training_cases
+
+from fake_packets import make_field_info, make_packet
+from rewards import CustomReward
+from rlgym_action_parser import DiscreteAction
+from rlgym_compat import GameState
+from rlgym_obs_builder import DefaultObs
+from rlgym_rewards import EventReward
+from terminals import KickoffTerminalCondition
+
+BASELINE_PATH = _path / "baseline.json"
+TEAM_SIZES = (1, 2, 3)
+N_STATES = 64 # Distinct states cycled through, so no case runs on a single cached state
+FPS = 120 / 8
+
+
+def _cycle(items):
+    index = 0
+
+    def next_item():
+        nonlocal index
+        index = (index + 1) % len(items)
+        return items[index]
+
+    return next_item
+
+
+def make_cases(team_size: int) -> dict:
+    """
+    Returns the benchmark cases of a team size as a dict of name -> callable running one operation.
+    """
+    rng = np.random.default_rng(team_size)
+    n_cars = 2 * team_size
+    field_info = make_field_info()
+    packets = [make_packet(rng, n_cars, frame) for frame in range(1, N_STATES + 1)]
+    states = []
+    for packet in packets:
+        state = GameState(field_info)
+        state.decode(packet)
+        states.append(state)
+    next_packet = _cycle(packets)
+    next_state = _cycle(states)
+    previous_action = np.zeros(8)
+    actions = rng.integers(0, 3, (n_cars, 8)).astype(np.float64)
+
+    decode_state = GameState(field_info)
+    preallocated_state = GameState(field_info, preallocate=True)
+
+    def decode():
+        decode_state.decode(next_packet())
+
+    def decode_preallocated():
+        preallocated_state.decode(next_packet())
+
+    physics = [player.car_data for state in states for player in state.players]
+    next_physics = _cycle(physics)
+
+    def euler_to_rotation_single():
+        for _ in range(n_cars):
+            obj = next_physics()
+            obj._euler_to_rotation(obj.euler_angles())
+
+    obs_builder = DefaultObs()
+    preallocated_obs_builder = DefaultObs(preallocate=True)
+    obs_builder.reset(states[0])
+    preallocated_obs_builder.reset(states[0])
+
+    def build_obs():
+        state = next_state()
+        for player in state.players:
+            obs_builder.build_obs(player, state, previous_action)
+
+    def build_obs_preallocated():
+        state = next_state()
+        for player in state.players:
+            preallocated_obs_builder.build_obs(player, state, previous_action)
+
+    def build_obs_batch():
+        obs_builder.build_obs_batch(next_state(), actions)
+
+    custom_reward = CustomReward()
+    custom_reward.reset(states[0])
+
+    def custom_reward_step():
+        state = next_state()
+        custom_reward.pre_step(state)
+        for player in state.players:
+            custom_reward.get_reward(player, state, previous_action)
+
+    event_reward = EventReward(touch=2.0, boost_pickup=1.0)
+    event_reward.reset(states[0])
+
+    def event_reward_step():
+        state = next_state()
+        for player in state.players:
+            event_reward.get_reward(player, state, previous_action)
+
+    terminal_condition = KickoffTerminalCondition(fps=FPS)
+    terminal_condition.reset(states[0])
+
+    def kickoff_terminal():
+        terminal_condition.is_terminal(next_state())
+
+    action_parser = DiscreteAction()
+
+    def parse_actions():
+        action_parser.parse_actions(actions, next_state())
+
+    return {
+        "GameState.decode": decode,
+        "GameState.decode[preallocate]": decode_preallocated,
+        "PhysicsObject._euler_to_rotation": euler_to_rotation_single,
+        "DefaultObs.build_obs": build_obs,
+        "DefaultObs.build_obs[preallocate]": build_obs_preallocated,
+        "DefaultObs.build_obs_batch": build_obs_batch,
+        "CustomReward": custom_reward_step,
+        "EventReward": event_reward_step,
+        "KickoffTerminalCondition.is_terminal": kickoff_terminal,
+        "DiscreteAction.parse_actions": parse_actions,
+    }
+
+
+def _sim_state(rng: np.random.Generator, n_cars: int):
+    """
+    Builds an rlgym_sim GameState with random physics for `n_cars` cars, alternating blue and orange, from the flat
+    list of values the simulator sends.
+    """
+    from rlgym_sim.utils.gamestates import GameState as SimGameState
+
+    mirror = np.array([-1, -1, 1])
+
+    def physics(position, velocity, angular_velocity):
+        quaternion = rng.normal(size=4)
+        return [*position, *quaternion / np.linalg.norm(quaternion), *velocity, *angular_velocity]
+
+    ball = rng.normal(0, 1000, (3, 3)) * [[1], [1], [0.003]]
+    values = [0, 0, 0, *rng.integers(2, size=34)]
+    values += [*ball.ravel(), *(ball * mirror).ravel()]
+    for i in range(n_cars):
+        position, velocity = rng.normal(0, 1000, (2, 3))
+        angular_velocity = rng.normal(0, 3, 3)
+        values += [i + 1, i % 2]
+        values += physics(position, velocity, angular_velocity)
+        values += physics(position * mirror, velocity * mirror, angular_velocity * mirror)
+        # Goals, saves, shots, demolishes, boost pickups, demoed, on ground, ball touched, jump, flip, boost
+        values += [*rng.integers(3, size=4), 0, 0, *rng.integers(2, size=4), rng.uniform()]
+    return SimGameState(values)
+
+
+def make_training_cases(team_size: int) -> dict:
+    """
+    Returns the benchmark cases of the training environment components of a team size, stepped the way rlgym_sim
+    steps them, or an empty dict without rlgym_sim.
+    """
+    try:
+        from action_parser import LookupTableAction
+        from obs_builder import BatchDefaultObs
+        from reward import CustomReward as TrainingReward
+    except ImportError as e:
+        print(F"Skipping the training environment cases: {e}")
+        return {}
+
+    rng = np.random.default_rng(team_size)
+    n_cars = 2 * team_size
+    states = [_sim_state(rng, n_cars) for _ in range(N_STATES)]
+    next_state = _cycle(states)
+    previous_action = np.zeros(8)
+    actions = rng.integers(0, 3, (n_cars, 8)).astype(np.float64)
+
+    obs_builder = BatchDefaultObs(preallocate=True)
+    obs_builder.reset(states[0])
+
+    def build_obs():
+        state = next_state()
+        obs_builder.pre_step(state)
+        for player in state.players:
+            obs_builder.build_obs(player, state, previous_action)
+
+    reward = TrainingReward()
+    reward.reset(states[0])
+
+    def reward_step():
+        state = next_state()
+        reward.pre_step(state)
+        for player in state.players:
+            reward.get_reward(player, state, previous_action)
+
+    action_parser = LookupTableAction()
+
+    def parse_actions():
+        action_parser.parse_actions(actions, next_state())
+
+    return {
+        "obs_builder.BatchDefaultObs[preallocate]": build_obs,
+        "reward.CustomReward": reward_step,
+        "action_parser.LookupTableAction.parse_actions": parse_actions,
+    }
+
+
+def measure_ops(operation, min_time: float, repeat: int) -> float:
+    """
+    Returns the best operations per second over `repeat` runs of at least `min_time` seconds each.
+    """
+    # Calibrate the number of operations per run on a short run
+    n_ops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(n_ops):
+            operation()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10:
+            break
+        n_ops *= 2
+    n_ops = max(1, int(n_ops * min_time / elapsed))
+
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(n_ops):
+            operation()
+        best = max(best, n_ops / (time.perf_counter() - start))
+    return best
+
+
+def measure_allocations(operation, n_calls: int = 32) -> float:
+    """
+    Returns the mean peak memory, in bytes, allocated by one operation.
+    """
+    operation() # Lazily allocated buffers are not part of the steady state
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(n_calls):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            operation()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    return float(np.mean(peaks))
+
+
+def run(min_time: float, repeat: int, selected: list) -> dict:
+    results = {}
+    for team_size in TEAM_SIZES:
+        cases = make_cases(team_size)
+        cases.update(make_training_cases(team_size))
+        for name, operation in cases.items():
+            if selected and not any(pattern in name for pattern in selected):
+                continue
+            key = F"{name} ({team_size}v{team_size})"
+            results[key] = {
+                "ops_per_sec": measure_ops(operation, min_time, repeat),
+                "alloc_bytes": measure_allocations(operation),
+            }
+            print(F"{key:<52} {results[key]['ops_per_sec']:>12.0f} ops/s {results[key]['alloc_bytes']:>10.0f} B/op")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, alloc_slack: float) -> list:
+    """
+    Returns a message for every case slower, or allocating more, than its baseline beyond the tolerance.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        reference = baseline[key]
+        if result["ops_per_sec"] < reference["ops_per_sec"] * (1 - tolerance):
+            regressions.append(F"{key}: {result['ops_per_sec']:.0f} ops/s, baseline {reference['ops_per_sec']:.0f}")
+        if result["alloc_bytes"] > reference["alloc_bytes"] * (1 + tolerance) + alloc_slack:
+            regressions.append(F"{key}: {result['alloc_bytes']:.0f} B/op, baseline {reference['alloc_bytes']:.0f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot environment components.")
+    parser.add_argument("cases", nargs="*", help="Only run the cases whose name contains one of these")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline file (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Relative slowdown or allocation growth allowed")
+    parser.add_argument("--alloc-slack", type=float, default=256, help="Extra bytes per operation allowed")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case, the best one is kept")
+    args = parser.parse_args()
+
+    results = run(args.min_time, args.repeat, args.cases)
+    baseline_path = pathlib.Path(args.baseline)
+
+    if args.save_baseline:
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        baseline.update(results)
+        baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+        print(F"Baseline written to {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(F"No baseline at {baseline_path}, run with --save-baseline first")
+        return
+
+    regressions = compare(results, json.loads(baseline_path.read_text()), args.tolerance, args.alloc_slack)
+    if regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print(F"  {regression}")
+        sys.exit(1)
+    print("No regression")
+
+
+if __name__ == "__main__":
+    main()
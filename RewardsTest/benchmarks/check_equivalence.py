@@ -0,0 +1,160 @@
+"""
+Checks that the fast paths of the bot environment give the same results as the original per-player code, on
+synthetic packets for 1v1, 2v2 and 3v3 (and uneven car counts), so no game client is needed:
+
+    python benchmarks/check_equivalence.py
+
+- GameState(preallocate=True) against the PlayerData objects of the default GameState, bit for bit once cast to the
+  float32 of the preallocated arrays. The inverted yaw is computed in float32 there, it may differ by one float32 ulp,
+  and boost_pickups is left out: the default GameState builds new players every tick, so it never counts past 1
+- GameState.rotation_matrices() against the rotation_mtx() of every car, and the preallocated matrices against the
+  default ones, bit for bit
+- DefaultObs(preallocate=True).build_obs against DefaultObs.build_obs, bit for bit, and DefaultObs.build_obs_batch
+  against it, bit for bit once cast to float32
+
+Exits with 1 and lists the mismatches if any.
+"""
+import argparse
+import pathlib
+import sys
+
+import numpy as np
+
+_path = pathlib.Path(__file__).parent.resolve()
+sys.path.append(str(_path.parent / "src"))
+
+from fake_packets import make_field_info, make_packet
+from rlgym_compat import GameState
+from rlgym_obs_builder import DefaultObs
+
+CAR_COUNTS = (1, 2, 3, 4, 6)
+PLAYER_FIELDS = ("car_id", "team_num", "match_goals", "match_saves", "match_shots", "match_demolishes",
+                 "is_demoed", "on_ground", "ball_touched", "has_jump", "has_flip", "boost_amount")
+# Largest difference allowed on the inverted physics, one float32 ulp of the yaw rotated by pi
+INVERTED_TOLERANCE = float(np.spacing(np.float32(2 * np.pi)))
+# The rotation matrices are computed lazily, rotation_matrices() checks them
+def _physics_values(obj) -> np.ndarray:
+    return np.concatenate([obj.position, obj.euler_angles(), obj.linear_velocity, obj.angular_velocity])
+
+
+def _vary_packet(packet, rng: np.random.Generator, frame: int):
+    # Events fake_packets leaves out: lost touches, demolitions, saves, pickups and score changes
+    n_cars = packet.num_cars
+    if frame % 7 == 0:
+        packet.game_ball.latest_touch.time_seconds = 0
+    if frame % 5 == 0:
+        car = packet.game_cars[int(rng.integers(n_cars))]
+        car.is_demolished = True
+        car.score_info.saves = int(rng.integers(3))
+        car.score_info.demolitions = int(rng.integers(3))
+        packet.teams[int(rng.integers(2))].score = int(rng.integers(4))
+    if frame % 11 == 0:
+        packet.game_cars[0].boost = 100
+
+
+def _same_physics(reference, obj, inverted: bool) -> bool:
+    expected = _physics_values(reference).astype(np.float32)
+    if inverted:
+        return np.allclose(_physics_values(obj), expected, rtol=0, atol=INVERTED_TOLERANCE)
+    return np.array_equal(_physics_values(obj), expected)
+
+
+def check_states(reference: GameState, state: GameState) -> list:
+    """
+    Returns the fields where the preallocated `state` differs from the default `reference`, decoded from the same
+    packet.
+    """
+    errors = []
+
+    for name in ("blue_score", "orange_score", "last_touch"):
+        if getattr(reference, name) != getattr(state, name):
+            errors.append(name)
+    if not np.array_equal(reference.boost_pads, state.boost_pads):
+        errors.append("boost_pads")
+    if len(reference.players) != len(state.players):
+        errors.append("players")
+        return errors
+
+    for name, inverted in (("ball", False), ("inverted_ball", True)):
+        if not _same_physics(getattr(reference, name), getattr(state, name), inverted):
+            errors.append(name)
+    for i, (player, view) in enumerate(zip(reference.players, state.players)):
+        for name in PLAYER_FIELDS:
+            if np.float32(getattr(player, name)) != getattr(view, name):
+                errors.append(f"players[{i}].{name}")
+        for name, inverted in (("car_data", False), ("inverted_car_data", True)):
+            if not _same_physics(getattr(player, name), getattr(view, name), inverted):
+                errors.append(f"players[{i}].{name}")
+    return errors
+
+
+def check_rotations(state: GameState) -> list:
+    errors = []
+    for inverted, name in ((False, "car_data"), (True, "inverted_car_data")):
+        expected = np.stack([getattr(player, name).rotation_mtx() for player in state.players])
+        if not np.array_equal(state.rotation_matrices(inverted), expected):
+            errors.append(f"rotation_matrices(inverted={inverted})")
+    return errors
+
+
+def check_obs(state: GameState, previous_actions: np.ndarray) -> list:
+    errors = []
+    obs_builder = DefaultObs()
+    preallocated_obs_builder = DefaultObs(preallocate=True)
+    obs_builder.reset(state)
+    preallocated_obs_builder.reset(state)
+    batch = obs_builder.build_obs_batch(state, previous_actions)
+    for i, player in enumerate(state.players):
+        expected = obs_builder.build_obs(player, state, previous_actions[i])
+        if not np.array_equal(preallocated_obs_builder.build_obs(player, state, previous_actions[i]), expected):
+            errors.append(f"build_obs[preallocate] of player {i}")
+        if not np.array_equal(batch[i], expected.astype(np.float32)):
+            errors.append(f"build_obs_batch row {i}")
+    return errors
+
+
+def run(n_frames: int, seed: int) -> list:
+    field_info = make_field_info()
+    failures = []
+    for n_cars in CAR_COUNTS:
+        rng = np.random.default_rng(seed + n_cars)
+        reference = GameState(field_info)
+        preallocated_state = GameState(field_info, preallocate=True)
+        for frame in range(1, n_frames + 1):
+            packet = make_packet(rng, n_cars, frame)
+            _vary_packet(packet, rng, frame)
+            ticks_elapsed = int(rng.integers(1, 9))
+            for state in (reference, preallocated_state):
+                state.decode(packet, ticks_elapsed)
+
+            errors = check_states(reference, preallocated_state)
+            errors += [
+                f"rotation_matrices(inverted={inverted}) against the default GameState" for inverted in (False, True)
+                if not np.array_equal(preallocated_state.rotation_matrices(inverted),
+                                      reference.rotation_matrices(inverted))
+            ]
+            previous_actions = rng.integers(0, 3, (n_cars, 8)) - 1.0
+            for state in (reference, preallocated_state):
+                errors += check_rotations(state)
+                errors += check_obs(state, previous_actions)
+            failures += [f"{n_cars} cars, frame {frame}: {error}" for error in errors]
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the fast paths of the bot environment against the original.")
+    parser.add_argument("--frames", type=int, default=200, help="Packets decoded per car count")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failures = run(args.frames, args.seed)
+    if failures:
+        print(F"{len(failures)} mismatches:")
+        for failure in failures[:50]:
+            print(F"  {failure}")
+        sys.exit(1)
+    print(F"No mismatch over {args.frames} packets for {', '.join(map(str, CAR_COUNTS))} cars")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import math
+
+import numpy as np
+from rlbot.utils.structures.game_data_struct import FieldInfoPacket, GameTickPacket
+
+NUM_BOOSTS = 34
+
+
+def make_field_info() -> FieldInfoPacket:
+    field_info = FieldInfoPacket()
+    field_info.num_boosts = NUM_BOOSTS
+    return field_info
+
+
+def _randomize_vector(vector, rng: np.random.Generator, scale: float):
+    vector.x, vector.y, vector.z = rng.normal(0, scale, 3)
+
+
+def make_packet(rng: np.random.Generator, n_cars: int, frame: int) -> GameTickPacket:
+    """
+    Builds a GameTickPacket with random physics for `n_cars` cars, alternating blue and orange, as RLBot would send
+    it on frame `frame`. No game client is needed.
+    """
+    packet = GameTickPacket()
+    packet.num_cars = n_cars
+    packet.num_boost = NUM_BOOSTS
+    packet.game_info.frame_num = frame
+    packet.game_info.seconds_elapsed = frame / 120
+    for i in range(NUM_BOOSTS):
+        packet.game_boosts[i].is_active = bool(rng.integers(2))
+
+    ball = packet.game_ball
+    _randomize_vector(ball.physics.location, rng, 1000)
+    _randomize_vector(ball.physics.velocity, rng, 1000)
+    _randomize_vector(ball.physics.angular_velocity, rng, 3)
+    ball.latest_touch.time_seconds = packet.game_info.seconds_elapsed - 0.01
+    ball.latest_touch.player_index = int(rng.integers(n_cars))
+
+    for i in range(n_cars):
+        car = packet.game_cars[i]
+        _randomize_vector(car.physics.location, rng, 1000)
+        _randomize_vector(car.physics.velocity, rng, 1000)
+        _randomize_vector(car.physics.angular_velocity, rng, 3)
+        rotation = car.physics.rotation
+        rotation.pitch, rotation.yaw, rotation.roll = rng.uniform(-math.pi, math.pi, 3)
+        car.team = i % 2
+        car.boost = int(rng.integers(0, 101))
+        car.has_wheel_contact = bool(rng.integers(2))
+        car.jumped = bool(rng.integers(2))
+        car.double_jumped = bool(rng.integers(2))
+        car.score_info.goals = int(rng.integers(3))
+        car.score_info.shots = int(rng.integers(3))
+    return packet
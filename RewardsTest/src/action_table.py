@@ -0,0 +1,91 @@
+"""
+Precomputed control tables of the DiscreteAction action space, shared by the action parser of the bot
+(rlgym_action_parser.py) and the one of the training environment (action_parser.py at the root of the repo).
+
+Only numpy and gym are imported here, so the training side can use it without RLBot installed.
+"""
+import gym.spaces
+import numpy as np
+
+
+def make_control_table(n_bins: int = 3) -> np.ndarray:
+    """
+    Function that returns the controls of every DiscreteAction combination as a float32 array of shape
+    (n_bins^5 * 2^3, 8). Row `LookupTableAction.flat_index(actions)` holds what DiscreteAction.parse_actions returns.
+    """
+    bins = [n_bins] * 5 + [2] * 3
+    table = np.indices(bins, dtype=np.float32).reshape(len(bins), -1).T.copy()
+    table[:, :5] = table[:, :5] / (n_bins // 2) - 1
+    return table
+
+
+def curated_actions() -> np.ndarray:
+    """
+    Function that returns a reduced set of 90 meaningful controls: ground driving with optional boost and handbrake,
+    and aerial rotations with optional jump and boost (without the yaw of dodges, handbrake on for wavedashes).
+    """
+    actions = []
+    # Ground
+    for throttle in (-1, 0, 1):
+        for steer in (-1, 0, 1):
+            for boost in (0, 1):
+                for handbrake in (0, 1):
+                    if boost == 1 and throttle != 1:
+                        continue
+                    actions.append([throttle or boost, steer, 0, steer, 0, 0, boost, handbrake])
+    # Aerial
+    for pitch in (-1, 0, 1):
+        for yaw in (-1, 0, 1):
+            for roll in (-1, 0, 1):
+                for jump in (0, 1):
+                    for boost in (0, 1):
+                        if jump == 1 and yaw != 0: # Only need roll for sideflip
+                            continue
+                        if pitch == roll == jump == 0: # Duplicate with ground
+                            continue
+                        handbrake = jump == 1 and (pitch != 0 or yaw != 0 or roll != 0)
+                        actions.append([boost, yaw, pitch, yaw, roll, jump, boost, handbrake])
+    return np.array(actions, dtype=np.float32)
+
+
+class LookupTable(object):
+    """
+    DiscreteAction backed by a precomputed control table, parsing is a single gather of table rows. With the full
+    table, actions are the same (n, 8) bins as DiscreteAction; with a curated table, they are one row index per agent.
+
+    Mixed into the ActionParser base of each side, as `class LookupTableAction(LookupTable, ActionParser)`.
+    """
+
+    def __init__(self, n_bins=3, table: np.ndarray = None):
+        """
+        :param n_bins: Number of bins of the analog actions, as in DiscreteAction.
+        :param table: Array of shape (n_actions, 8) with the controls of a reduced action set, e.g. curated_actions().
+        None uses every DiscreteAction combination.
+        """
+        super().__init__()
+        assert n_bins % 2 == 1, "n_bins must be an odd number"
+        self._n_bins = n_bins
+        self._bins = np.array([n_bins] * 5 + [2] * 3)
+        # Mixed radix strides of the bins, the first action being the most significant
+        self._strides = np.concatenate((np.cumprod(self._bins[::-1])[::-1][1:], [1])).astype(np.intp)
+
+        self.curated = table is not None
+        self.table = make_control_table(n_bins) if table is None else np.array(table, dtype=np.float32)
+        # Rows are handed out as is (e.g. as the previous action of the bot), an in-place edit would corrupt the table
+        self.table.flags.writeable = False
+
+    def get_action_space(self) -> gym.spaces.Space:
+        if self.curated:
+            return gym.spaces.Discrete(len(self.table))
+        return gym.spaces.MultiDiscrete(self._bins.tolist())
+
+    def flat_index(self, actions: np.ndarray) -> np.ndarray:
+        """
+        Function that returns the table row of every agent's actions, as an array of shape (n,).
+        """
+        if self.curated:
+            return np.asarray(actions).reshape(-1).astype(np.intp, copy=False)
+        return np.asarray(actions).reshape((-1, 8)).astype(np.intp, copy=False) @ self._strides
+
+    def parse_actions(self, actions: np.ndarray, state) -> np.ndarray:
+        return np.take(self.table, self.flat_index(actions), axis=0)
@@ -0,0 +1,128 @@
+"""
+Vectorized DefaultObs, shared by the observation builder of the bot (rlgym_obs_builder.py) and the one of the
+training environment (obs_builder.py at the root of the repo).
+
+Only numpy is imported here, so the training side can use it without RLBot installed. The game state and players
+are duck-typed: both the rlgym_compat and the rlgym_sim ones have the attributes read below.
+"""
+import numpy as np
+
+BALL_OBS_LENGTH = 9
+CAR_OBS_LENGTH = 19
+NUM_ACTIONS = 8
+ORANGE_TEAM = 1
+
+# Sign masks mirroring the blue point of view to the orange one. Flipping the sign commutes exactly with the
+# normalization, so masked rows are bit-identical to the rows built from the inverted objects.
+_BALL_INVERT = np.asarray([-1, -1, 1] * 3, dtype=np.float64)
+_CAR_INVERT = np.asarray([-1, -1, 1] * 5 + [1] * 4, dtype=np.float64)
+
+
+class ObsLayout(object):
+    """
+    Named slices of a DefaultObs observation for a player with `n_allies` allies and `n_enemies` enemies.
+    """
+
+    def __init__(self, n_pads: int, n_allies: int, n_enemies: int):
+        start = 0
+        self.ball = slice(start, start + BALL_OBS_LENGTH)
+        start += BALL_OBS_LENGTH
+        self.previous_action = slice(start, start + NUM_ACTIONS)
+        start += NUM_ACTIONS
+        self.pads = slice(start, start + n_pads)
+        start += n_pads
+        # The player the observation is built for
+        self.player = slice(start, start + CAR_OBS_LENGTH)
+        start += CAR_OBS_LENGTH
+        self.allies = slice(start, start + CAR_OBS_LENGTH * n_allies)
+        start += CAR_OBS_LENGTH * n_allies
+        self.enemies = slice(start, start + CAR_OBS_LENGTH * n_enemies)
+        start += CAR_OBS_LENGTH * n_enemies
+        self.size = start
+
+
+class BatchObs(object):
+    """
+    build_obs_batch of DefaultObs, mixed into the DefaultObs of each side, which provides the POS_COEF,
+    LIN_VEL_COEF and ANG_VEL_COEF normalization coefficients and the orientation of the cars (see _car_axes).
+    """
+
+    def _car_axes(self, state, inverted: bool):
+        """
+        Function that returns the forward and up vectors of every player's car, as two arrays of shape
+        (n_players, 3), from the orange point of view if `inverted`.
+
+        :return: The two arrays, or None when `inverted` if the sign mask of the blue vectors gives the orange ones.
+        """
+        raise NotImplementedError
+
+    def build_obs_batch(self, state, previous_actions: np.ndarray, dtype=np.float32,
+                        out: np.ndarray = None) -> np.ndarray:
+        """
+        Function to build the observations of every player in one vectorized pass. Row i is bit-identical to
+        `DefaultObs.build_obs(state.players[i], state, previous_actions[i])` cast to `dtype`.
+
+        :param state: The current state of the game.
+        :param previous_actions: Array of shape (n_players, 8) with the action each player took at the previous
+        environment step. None leaves the previous action columns zeroed.
+        :param dtype: Type of the returned matrix.
+        :param out: Matrix to write the observations into. It is used when its shape and type match, otherwise a new
+        matrix is allocated.
+
+        :return: An array of shape (n_players, obs_size), one observation per player.
+        """
+        players = state.players
+        n_players = len(players)
+        pads = state.boost_pads
+        obs_size = BALL_OBS_LENGTH + NUM_ACTIONS + len(pads) + CAR_OBS_LENGTH * n_players
+        if out is not None and out.shape == (n_players, obs_size) and out.dtype == dtype:
+            obs = out
+        else:
+            obs = np.empty((n_players, obs_size), dtype=dtype)
+        if n_players == 0:
+            return obs
+
+        teams = np.fromiter((p.team_num for p in players), dtype=np.int64, count=n_players)
+        inverted = (teams == ORANGE_TEAM).astype(np.intp)
+
+        ball = state.ball
+        ball_obs = np.empty((2, BALL_OBS_LENGTH))
+        ball_obs[0, 0:3] = ball.position * self.POS_COEF
+        ball_obs[0, 3:6] = ball.linear_velocity * self.LIN_VEL_COEF
+        ball_obs[0, 6:9] = ball.angular_velocity * self.ANG_VEL_COEF
+        np.multiply(ball_obs[0], _BALL_INVERT, out=ball_obs[1])
+
+        cars = [p.car_data for p in players]
+        car_obs = np.empty((2, n_players, CAR_OBS_LENGTH))
+        car_obs[0, :, 0:3] = np.stack([c.position for c in cars]) * self.POS_COEF
+        car_obs[0, :, 3:6], car_obs[0, :, 6:9] = self._car_axes(state, False)
+        car_obs[0, :, 9:12] = np.stack([c.linear_velocity for c in cars]) * self.LIN_VEL_COEF
+        car_obs[0, :, 12:15] = np.stack([c.angular_velocity for c in cars]) * self.ANG_VEL_COEF
+        car_obs[0, :, 15:19] = [
+            [p.boost_amount, int(p.on_ground), int(p.has_flip), int(p.is_demoed)] for p in players
+        ]
+        if inverted.any():
+            np.multiply(car_obs[0], _CAR_INVERT, out=car_obs[1])
+            inverted_axes = self._car_axes(state, True)
+            if inverted_axes is not None:
+                car_obs[1, :, 3:6], car_obs[1, :, 6:9] = inverted_axes
+
+        start = 0
+        obs[:, start:start + BALL_OBS_LENGTH] = ball_obs[inverted]
+        start += BALL_OBS_LENGTH
+        obs[:, start:start + NUM_ACTIONS] = 0 if previous_actions is None else previous_actions
+        start += NUM_ACTIONS
+        obs[:, start:start + len(pads)] = np.stack((pads, state.inverted_boost_pads))[inverted]
+        start += len(pads)
+
+        rows = np.arange(n_players)
+        obs[:, start:start + CAR_OBS_LENGTH] = car_obs[inverted, rows]
+        start += CAR_OBS_LENGTH
+
+        # Every other player sorted allies first, then enemies, keeping the order of state.players
+        order_key = (teams[:, None] != teams[None, :]).astype(np.int8)
+        order_key[rows, rows] = 2
+        others = np.argsort(order_key, axis=1, kind="stable")[:, :n_players - 1]
+        obs[:, start:] = car_obs[inverted[:, None], others].reshape(n_players, -1)
+
+        return obs
@@ -0,0 +1,242 @@
+"""
+Vectorized CustomReward, shared by the reward of the bot (rewards.py) and the one of the training environment
+(reward.py at the root of the repo).
+
+Only numpy is imported here, so the training side can use it without RLBot installed. The game state and players
+are duck-typed: both the rlgym_compat and the rlgym_sim ones have the attributes read below.
+"""
+import numpy as np
+
+# Same values as the common_values of rlgym_sim and rlgym_compat
+BALL_RADIUS = 92.75
+CAR_MAX_SPEED = 2300
+BLUE_TEAM = 0
+ORANGE_TEAM = 1
+
+# Order of the columns returned by reward_components, matching the keys of CustomReward.rewardWeights
+REWARD_COMPONENTS = ("ball_touched", "velocity_player_to_ball", "naive_speed", "event")
+
+
+def reward_components(
+    ball_position: np.ndarray, car_positions: np.ndarray, car_velocities: np.ndarray,
+    ball_touched: np.ndarray, event_rewards: np.ndarray, aerial_weight: float = 0.0,
+    use_scalar_projection: bool = False
+) -> np.ndarray:
+    """
+    Vectorized TouchBallReward, VelocityPlayerToBallReward and NaiveSpeedReward for many cars at once, stacked with
+    the EventReward values computed by the caller. `ball_position` must broadcast against `car_positions`,
+    e.g. (3,) for (n_cars, 3) or (T, 1, 3) for (T, n_cars, 3).
+
+    :param aerial_weight: aerial_weight of TouchBallReward.
+    :param use_scalar_projection: use_scalar_projection of VelocityPlayerToBallReward, the velocity towards the ball
+    is then the scalar projection of the velocity on the offset to the ball, 0 when the car is on the ball.
+
+    :return: An array of shape car_positions.shape[:-1] + (len(REWARD_COMPONENTS),).
+    """
+    components = np.empty(car_positions.shape[:-1] + (len(REWARD_COMPONENTS),))
+
+    touch = ((ball_position[..., 2] + BALL_RADIUS) / (2 * BALL_RADIUS)) ** aerial_weight
+    components[..., 0] = np.where(ball_touched, touch, 0.0)
+
+    offsets = ball_position - car_positions
+    if use_scalar_projection:
+        distances = np.linalg.norm(offsets, axis=-1)
+        speeds_to_ball = np.einsum("...i,...i->...", car_velocities, offsets)
+        components[..., 1] = 0.0
+        np.divide(speeds_to_ball, distances, out=components[..., 1], where=distances != 0)
+    else:
+        norm_offsets = offsets / np.linalg.norm(offsets, axis=-1, keepdims=True)
+        components[..., 1] = np.einsum("...i,...i->...", norm_offsets, car_velocities / CAR_MAX_SPEED)
+
+    components[..., 2] = np.linalg.norm(car_velocities, axis=-1) / CAR_MAX_SPEED
+    components[..., 3] = event_rewards
+    return components
+
+
+def event_values(player, state) -> np.ndarray:
+    """
+    Function that returns the values EventReward tracks for a player: goals, team score, opponent score, ball
+    touched, shots, saves, demolishes and boost amount.
+    """
+    if player.team_num == BLUE_TEAM:
+        team, opponent = state.blue_score, state.orange_score
+    else:
+        team, opponent = state.orange_score, state.blue_score
+
+    return np.array([
+        player.match_goals,
+        team,
+        opponent,
+        player.ball_touched,
+        player.match_shots,
+        player.match_saves,
+        player.match_demolishes,
+        player.boost_amount,
+    ])
+
+
+class EventDeltas(object):
+    """
+    EventReward for every player at once: the weighted increase of the event_values of every player since the
+    previous step.
+    """
+
+    def __init__(self, goal=0.0, team_goal=0.0, concede=-0.0, touch=0.0, shot=0.0, save=0.0, demo=0.0,
+                 boost_pickup=0.0):
+        """
+        The parameters are the ones of EventReward.
+        """
+        self.weights = np.array([goal, team_goal, concede, touch, shot, save, demo, boost_pickup])
+
+        # Need to keep track of last registered value to detect changes
+        self.last_registered_values = {}
+
+    def reset(self, initial_state):
+        # Update every reset since rocket league may crash and be restarted with clean values
+        self.last_registered_values = {
+            player.car_id: event_values(player, initial_state) for player in initial_state.players
+        }
+
+    def get_rewards(self, state) -> np.ndarray:
+        """
+        Function that returns the event reward of every player, in the order of state.players, and registers their
+        current values.
+
+        :return: An array of shape (n_players,).
+        """
+        players = state.players
+        new_values = np.stack([event_values(player, state) for player in players])
+        old_values = np.stack([self.last_registered_values[player.car_id] for player in players])
+
+        diff_values = np.maximum(new_values - old_values, 0) # We only care about increasing values
+
+        for player, values in zip(players, new_values):
+            self.last_registered_values[player.car_id] = values
+        return diff_values @ self.weights
+
+
+class BatchCustomReward(object):
+    """
+    CustomReward computed for every player at once in pre_step, get_reward and get_final_reward only pick a row.
+    Mixed into the RewardFunction base of each side, as `class CustomReward(BatchCustomReward, RewardFunction)`,
+    whose __init__ also creates the `ballTouchedByPlayer`, `velocityPlayerToBallReward` and `naiveSpeedReward`
+    sub-rewards of that side. Their aerial_weight and use_scalar_projection are honoured.
+
+    `telemetry` is None or an object recording the components and final bonuses, see reward.RewardTelemetry.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rewardWeights = {
+            "ball_touched": 4.00,
+            "velocity_player_to_ball": 0.20,
+            "naive_speed": 0.50,
+            "event": 0.03
+        }
+        self.eventReward = EventDeltas( # Returns a reward for each event / Max 1.0 * 1.0 + 1.0 * 2.0 = 3.00
+            touch=2.0,
+            boost_pickup=1.0,
+        )
+
+        #self.gamma = gamma      # 0.9908006132652293
+        #self.upperBound = 9.25  # Maximum reward per tick
+        #self.finalUpperBound = (self.upperBound / (1 - self.gamma)) / 25 # 25 is a magic number that we found to work discretely well.
+
+        # New calculation for the final reward (given by RLBot over 100 episodes)
+        threshold_to_add = 0.5
+        self.finalUpperBound = 0.3686379850539045 + threshold_to_add
+
+        self.telemetry = None
+
+    def reset(self, initial_state):
+        self.ballTouchedByPlayer.reset(initial_state)
+        self.velocityPlayerToBallReward.reset(initial_state)
+        self.naiveSpeedReward.reset(initial_state)
+        self.eventReward.reset(initial_state)
+
+    def pre_step(self, state):
+        # All the sub-rewards are computed here for every player at once, get_reward and get_final_reward only pick
+        # a row
+        players = state.players
+        n_players = len(players)
+        self._rows = {player.car_id: i for i, player in enumerate(players)}
+        if n_players == 0:
+            self.components = np.zeros((0, len(REWARD_COMPONENTS)))
+            self.rewards = self.final_bonus = np.zeros(0)
+            return
+
+        car_positions = np.stack([player.car_data.position for player in players])
+        car_velocities = np.stack([player.car_data.linear_velocity for player in players])
+        ball_touched = np.fromiter((player.ball_touched for player in players), dtype=bool, count=n_players)
+        teams = np.fromiter((player.team_num for player in players), dtype=np.int64, count=n_players)
+
+        self.components = reward_components(
+            state.ball.position, car_positions, car_velocities, ball_touched,
+            self.eventReward.get_rewards(state), self.ballTouchedByPlayer.aerial_weight,
+            self.velocityPlayerToBallReward.use_scalar_projection
+        )
+
+        # Weights are read every step, so rewardWeights can still be tuned on a live instance
+        weights = np.array([self.rewardWeights[name] for name in REWARD_COMPONENTS])
+        self.rewards = self.components @ weights
+        if self.telemetry is not None:
+            self.telemetry.record(self.components, weights)
+
+        # ==================================
+        # Team:
+        #   - 0 -> Blue team
+        #   - 1 -> Orange team
+        # Field:
+        #   - Positive coord -> Orange field
+        #   - Negative coord -> Blue field
+        # If the ball is being sent towards the opposite field, give a positive final reward
+        # else, give a negative final reward
+        # ==================================
+        ball_y = state.ball.position[1]
+        towards_opponent = ((teams == BLUE_TEAM) & (ball_y > 0)) | ((teams == ORANGE_TEAM) & (ball_y < 0))
+        self.final_bonus = np.where(towards_opponent, self.finalUpperBound, -self.finalUpperBound)
+
+    # // TODO
+    # We could add a possible reward(s) as follows:
+    # 1) Agent should learn to use boost properly
+    # 2) Agent should learn to use dodge properly
+    def get_reward(self, player, state, previous_action: np.ndarray) -> float:
+        # Weighted sum of the ball touched, velocity player to ball, naive speed and event rewards computed in
+        # pre_step
+        return float(self.rewards[self._rows[player.car_id]])
+
+    def get_final_reward(self, player, state, previous_action: np.ndarray) -> float:
+        # Final reward is given when ball is outside of the radius or when the timeout is reached.
+        # The sub-rewards have no final reward of their own, so it is the step reward plus the final bonus,
+        # i.e. the maximum reward per tick divided by the discount factor (see pre_step)
+        row = self._rows[player.car_id]
+        if self.telemetry is not None:
+            self.telemetry.record_final_bonus(self.final_bonus[row])
+        return float(self.rewards[row] + self.final_bonus[row])
+
+    def get_rewards(self, state, previous_actions: np.ndarray) -> np.ndarray:
+        """
+        Rewards of every player, in the order of state.players. pre_step must have been called for this state.
+
+        :param state: The current state of the game.
+        :param previous_actions: Array of shape (n_players, 8) with the actions taken at the previous environment
+        step.
+
+        :return: An array of shape (n_players,).
+        """
+        return self.rewards
+
+    def get_final_rewards(self, state, previous_actions: np.ndarray) -> np.ndarray:
+        """
+        Final rewards of every player, in the order of state.players. pre_step must have been called for this state.
+
+        :param state: The current state of the game.
+        :param previous_actions: Array of shape (n_players, 8) with the actions taken at the previous environment
+        step.
+
+        :return: An array of shape (n_players,).
+        """
+        if self.telemetry is not None:
+            for bonus in self.final_bonus:
+                self.telemetry.record_final_bonus(bonus)
+        return self.rewards + self.final_bonus
@@ -1,4 +1,5 @@
 import math
+import os
 import time
 import torch
 import pathlib
@@ -12,30 +13,42 @@ from rlbot.utils.game_state_util import GameState
 from rlbot.utils.game_state_util import GameState as RLBotGameState
 from rlbot.utils.game_state_util import Physics, Rotator, Vector3
 from rlbot.utils.structures.game_data_struct import GameTickPacket
-from rlgym_ppo.ppo import MultiDiscreteFF
 
+from inference_server import InferenceClient
+from policy_runtime import AsyncPolicy, load_policy
+from reward_log import AsyncRewardLogWriter
 from rewards import CustomReward
-from rlgym_action_parser import DiscreteAction
+from rlgym_action_parser import LookupTableAction
 from rlgym_compat import GameState as RLGymGameState
 from rlgym_compat.common_values import BLUE_GOAL_BACK, ORANGE_GOAL_BACK
 from rlgym_obs_builder import DefaultObs
+from shared_state import SharedMemoryPolicy
 from terminals import KickoffTerminalCondition
 
 
 class MyBot(BaseAgent):
     def __del__(self):
-        if self.fp:
-            self.fp.close()
-        if self.fp1:
-            self.fp1.close()
+        if self.reward_log:
+            self.reward_log.close()
 
     def __init__(self, name, team, index):
         super().__init__(name, team, index)
-        self.fp = open("dataFirstPlayer.txt", "a")
-        self.fp1 = open("dataSecondPlayer.txt", "a")
+        self.reward_log = None
+        self.async_policy = None
+        self.shared_policy = None
+        self.policy = None
         self.tick_skip = 8
         self.half_life_seconds = 5
         self.include_final_reward = True
+        self.obs_size = 89
+        self.log_obs = False # Also store the observation and the action of every decision in the reward log
+        self.policy_device = None # "cuda", "cpu" or None to pick CUDA when available
+        self.policy_threads = 1 # Torch threads of this bot for CPU inference
+        self.policy_variant = None # "int8" or "bf16" to run a quantized export of export_policy.py --quantize on the CPU
+        self.async_inference = False # Run the policy on a background thread, the last controls are kept meanwhile
+        self.inference_server = None # Address of a running inference_server.py, e.g. ("localhost", 52525), to share its policy
+        self.policy_process = False # Build the observations and run the policy in a separate process, see shared_state.py
+        self.policy_process_cpus = None # Cores the policy process is pinned to, e.g. [2, 3]
 
     def initialize_agent(self):
         # Start car in specific position
@@ -54,7 +67,7 @@ class MyBot(BaseAgent):
         self.fps = 120 / self.tick_skip
         self.gamma = np.exp(np.log(0.5) / (self.fps * self.half_life_seconds))
         self.field_info = self.get_field_info()
-        self.game_state = RLGymGameState(self.field_info)
+        self.game_state = RLGymGameState(self.field_info, preallocate=True)
         self.ticks = 0
         self.prev_tick = 0
         self.ticks_elapsed_since_update = 0
@@ -62,18 +75,74 @@ class MyBot(BaseAgent):
         self.prev_action = np.zeros(8)
         self.reward_function = CustomReward(gamma=self.gamma)
         self.terminal_condition = KickoffTerminalCondition(fps=self.fps)
-        self.obs_builder = DefaultObs()
-        self.action_parser = DiscreteAction()
+        self.obs_builder = DefaultObs(preallocate=True)
+        self.action_parser = LookupTableAction()
+        # One controller state per row of the action table, built from plain Python values once
+        self.controller_states = [self.make_controls(action) for action in self.action_parser.table.tolist()]
         self.started = False
         self.checked_kickoff = False
-        self.policy = MultiDiscreteFF(89, (1024, 512, 512, 512), "cuda").to("cuda")
         _path = pathlib.Path(__file__).parent.resolve()
         sys.path.append(_path)
-        self.policy.load_state_dict(torch.load(str(_path) + "/checkpoint/PPO_POLICY.pt"))
-        print("Policy loaded!")
+        if self.policy_process:
+            # The policy process reads the decoded states from shared memory, this one only decodes, rewards and logs
+            process_args = ["--threads", str(self.policy_threads)]
+            if self.policy_device:
+                process_args += ["--device", self.policy_device]
+            if self.policy_variant:
+                process_args += ["--variant", self.policy_variant]
+            if self.policy_process_cpus:
+                process_args += ["--cpus"] + [str(cpu) for cpu in self.policy_process_cpus]
+            self.shared_policy = SharedMemoryPolicy(
+                f"softkick_{os.getpid()}_{self.index}", self.field_info.num_boosts, self.index, process_args=process_args
+            )
+            print("Policy process started!")
+        elif self.inference_server:
+            # The policy is loaded once by the server and batched with the requests of the other bots
+            self.policy = InferenceClient(self.inference_server)
+            print("Policy loaded!")
+        else:
+            # CUDA when available, otherwise the CPU export of export_policy.py (or the checkpoint itself)
+            self.policy = load_policy(
+                str(_path / "checkpoint"), self.obs_size, self.policy_device, self.policy_threads, self.policy_variant
+            )
+            print("Policy loaded!")
+        self.async_policy = AsyncPolicy(self.policy, self.obs_size) if self.async_inference and self.policy else None
+        # Ticks between an observation and the application of its action, in async mode
+        self.inference_lag = 0
+        self.max_inference_lag = 0
+        self.total_inference_lag = 0
+        self.inference_count = 0
         self.controls = SimpleControllerState()
         self.ticks_since_tried_score = 0
 
+        if self.log_obs and (self.async_policy or self.shared_policy):
+            # The action of an observation is only known ticks later in these modes, the pairs would be misaligned
+            print("log_obs is not supported with async_inference or policy_process, observations are not logged")
+            self.log_obs = False
+
+        # One binary log per player index, see analyze_data.py. Written by a background thread
+        log_name = "dataFirstPlayer.bin" if self.index == 0 else "dataSecondPlayer.bin"
+        self.reward_log = AsyncRewardLogWriter(
+            log_name,
+            obs_size=self.obs_size if self.log_obs else 0,
+            action_size=8 if self.log_obs else 0,
+            metadata={"gamma": self.gamma, "tick_skip": self.tick_skip},
+        )
+
+    def retire(self):
+        if self.shared_policy:
+            self.shared_policy.close()
+        if self.async_policy:
+            self.async_policy.close()
+        if (self.async_policy or self.shared_policy) and self.inference_count > 0:
+            print(f"Inference lag: mean {self.total_inference_lag / self.inference_count:.2f} ticks, max {self.max_inference_lag}")
+        if isinstance(self.policy, InferenceClient):
+            self.policy.close()
+        if self.reward_log:
+            self.reward_log.close()
+            if self.reward_log.dropped > 0:
+                print(f"Reward log: {self.reward_log.dropped} records dropped, {self.reward_log.written} written")
+
     def get_output(self, packet: GameTickPacket) -> SimpleControllerState:
         """
         This function will be called by the framework many times per second. This is where you can
@@ -93,6 +162,8 @@ class MyBot(BaseAgent):
             self.reward_function.reset(self.game_state)
             self.terminal_condition.reset(self.game_state)
             self.obs_builder.reset(self.game_state)
+            if self.shared_policy:
+                self.shared_policy.reset()
             self.ticks_elapsed_since_update = 0
             self.inverse_returns = 0
             self.done = False
@@ -102,6 +173,12 @@ class MyBot(BaseAgent):
             self.checked_kickoff = False
 
         if self.started:
+            pending_policy = self.shared_policy or self.async_policy
+            if pending_policy:
+                result = pending_policy.poll()
+                if result is not None:
+                    self.apply_action(*result, cur_tick)
+
             if self.ticks_elapsed_since_update >= self.tick_skip and not self.done:
                 self.done = self.terminal_condition.is_terminal(self.game_state)
                 player = self.game_state.players[self.index]
@@ -112,41 +189,34 @@ class MyBot(BaseAgent):
                 else:
                     reward = self.reward_function.get_reward(player, self.game_state, self.prev_action)
 
-                # Get observation
-                obs = self.obs_builder.build_obs(player, self.game_state, self.prev_action)
-
-                # Get action from Policy
-                action_idx, _ = self.policy.get_action(obs)
-                action = self.action_parser.parse_actions(action_idx.numpy(), self.game_state) # Parse action
-                self.update_controls(action[0]) # Update controls with our action
-
-                self.prev_action = action[0] # a = a'
-
-                self.ticks_elapsed_since_update = 0
-
-                # Write to file
-                if(self.index == 0):
-                    self.fp.write(f"{reward}\n")
+                if self.shared_policy:
+                    # The policy process builds the observation from the shared state, its action is applied later
+                    obs = None
+                    self.shared_policy.submit(self.game_state, cur_tick, self.prev_action)
                 else:
-                    self.fp1.write(f"{reward}\n")
+                    # Get observation
+                    obs = self.obs_builder.build_obs(player, self.game_state, self.prev_action)
 
-                # If we are done, write DONE to file and we exit from the if-statement
-                if self.done:
-                    if(self.index == 0):
-                        self.fp.write(f"DONE\n")
+                    # Get action from Policy. In async mode it is applied by a later tick, as soon as it is ready
+                    if self.async_policy:
+                        self.async_policy.submit(obs, cur_tick)
                     else:
-                        self.fp1.write(f"DONE\n")
+                        action_idx, _ = self.policy.get_action(obs)
+                        self.apply_action(action_idx.numpy(), cur_tick, cur_tick)
 
-                # Just flush the buffer to make sure that we don't lose any data
-                if(self.index == 0):
-                    self.fp.flush()
-                else:
-                    self.fp1.flush()
+                self.ticks_elapsed_since_update = 0
+
+                # Only queued here, never blocks on the disk
+                self.reward_log.write(cur_tick, self.index, reward, self.done, obs, self.prev_action)
 
             # Only for rendering purposes
             text = []
             if self.done:
                 text.append("EPISODE DONE")
+            if self.reward_log.dropped > 0:
+                text.append(f"LOG DROPPED: {self.reward_log.dropped}")
+            if self.async_policy or self.shared_policy:
+                text.append(f"INFERENCE LAG: {self.inference_lag} (MAX {self.max_inference_lag})")
 
             self.renderer.begin_rendering()
             self.renderer.draw_string_2d(
@@ -180,12 +250,29 @@ class MyBot(BaseAgent):
 
         return self.controls
 
+    def apply_action(self, action_idx: np.ndarray, obs_tick: int, cur_tick: int):
+        action_index = self.action_parser.flat_index(action_idx)[0] # Row of the action table
+        self.controls = self.controller_states[action_index] # Update controls with our action
+
+        self.prev_action = self.action_parser.table[action_index] # a = a' (read-only row of the table)
+
+        self.inference_lag = cur_tick - obs_tick
+        self.max_inference_lag = max(self.max_inference_lag, self.inference_lag)
+        self.total_inference_lag += self.inference_lag
+        self.inference_count += 1
+
+    @staticmethod
+    def make_controls(action) -> SimpleControllerState:
+        controls = SimpleControllerState()
+        controls.throttle = float(action[0])
+        controls.steer = float(action[1])
+        controls.pitch = float(action[2])
+        controls.yaw = float(action[3])
+        controls.roll = float(action[4])
+        controls.jump = bool(action[5] > 0)
+        controls.boost = bool(action[6] > 0)
+        controls.handbrake = bool(action[7] > 0)
+        return controls
+
     def update_controls(self, action):
-        self.controls.throttle = action[0]
-        self.controls.steer = action[1]
-        self.controls.pitch = action[2]
-        self.controls.yaw = action[3]
-        self.controls.roll = action[4]
-        self.controls.jump = action[5] > 0
-        self.controls.boost = action[6] > 0
-        self.controls.handbrake = action[7] > 0
+        self.controls = self.make_controls(action)
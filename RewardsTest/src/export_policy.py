@@ -0,0 +1,172 @@
+import argparse
+import copy
+import os
+import pathlib
+
+import numpy as np
+import torch
+
+from policy_runtime import (LAYER_SIZES, ONNX_POLICY, POLICY_CHECKPOINT, QUANTIZED_POLICIES, TORCHSCRIPT_POLICY,
+                            OnnxPolicyRuntime, PolicyRuntime, benchmark_latency, head_argmax, load_policy)
+from reward_log import read_reward_log
+
+OBS_SIZE = 89
+CHECKPOINT_FOLDER = str(pathlib.Path(__file__).parent.resolve() / "checkpoint")
+
+
+def load_model(checkpoint_folder: str, obs_size: int) -> torch.nn.Module:
+    """
+    Function that loads the MultiDiscreteFF checkpoint on the CPU, in eval mode.
+    """
+    from rlgym_ppo.ppo import MultiDiscreteFF
+
+    policy = MultiDiscreteFF(obs_size, LAYER_SIZES, "cpu")
+    policy.load_state_dict(torch.load(os.path.join(checkpoint_folder, POLICY_CHECKPOINT), map_location="cpu"))
+    policy.eval()
+    return policy
+
+
+def export_torchscript(model: torch.nn.Module, obs_size: int, path: str):
+    example = torch.zeros((1, obs_size), dtype=torch.float32)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    frozen = torch.jit.freeze(traced)
+    torch.jit.save(frozen, path)
+
+
+def export_onnx(model: torch.nn.Module, obs_size: int, path: str):
+    example = torch.zeros((1, obs_size), dtype=torch.float32)
+    torch.onnx.export(
+        model, example, path,
+        input_names=["obs"], output_names=["logits"],
+        dynamic_axes={"obs": {0: "batch"}, "logits": {0: "batch"}},
+    )
+
+
+class _BFloat16Policy(torch.nn.Module):
+    """
+    Runs the layers in bfloat16 while keeping float32 observations and logits, so the export stays a drop-in.
+    """
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model.to(torch.bfloat16)
+
+    def forward(self, obs: torch.Tensor) -> torch.Tensor:
+        return self.model(obs.to(torch.bfloat16)).float()
+
+
+def quantize(model: torch.nn.Module, variant: str) -> torch.nn.Module:
+    """
+    Function that returns a post-training quantized copy of the policy layers: dynamic int8 weights for every
+    Linear layer ("int8") or bfloat16 weights and activations ("bf16").
+    """
+    model = copy.deepcopy(model)
+    if variant == "int8":
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if variant == "bf16":
+        return _BFloat16Policy(model)
+    raise ValueError(f"Unknown quantization {variant}, expected one of {list(QUANTIZED_POLICIES)}")
+
+
+def export_quantized(model: torch.nn.Module, variant: str, obs_size: int, path: str):
+    example = torch.zeros((1, obs_size), dtype=torch.float32)
+    with torch.no_grad():
+        traced = torch.jit.trace(quantize(model, variant), example)
+    torch.jit.save(traced, path)
+
+
+def load_observations(log_paths: list, obs_size: int) -> np.ndarray:
+    """
+    Function that gathers the observations stored in reward logs written with `log_obs` enabled.
+    """
+    observations = []
+    for path in log_paths:
+        records = read_reward_log(path)
+        if "obs" not in records.dtype.names or records.dtype["obs"].shape != (obs_size,):
+            raise ValueError(f"{path} holds no observation of size {obs_size}, enable log_obs in the bot")
+        observations.append(np.array(records["obs"]))
+    return np.concatenate(observations)
+
+
+def action_agreement(model: torch.nn.Module, runtime: PolicyRuntime, observations: np.ndarray) -> tuple:
+    """
+    Function that compares the most likely action of the fp32 checkpoint and of an export on the same observations.
+
+    :return: A tuple with the fraction of observations where every head agrees and the agreement of each head.
+    """
+    with torch.inference_mode():
+        expected = model(torch.as_tensor(observations, dtype=torch.float32)).numpy()
+        exported = torch.cat([runtime.forward(torch.as_tensor(obs[None], dtype=torch.float32)) for obs in observations])
+    same = head_argmax(expected) == head_argmax(exported.numpy())
+    return same.all(axis=1).mean(), same.mean(axis=0)
+
+
+def check_export(model: torch.nn.Module, runtime: PolicyRuntime, observations: np.ndarray) -> float:
+    """
+    Function that returns the largest absolute difference between the logits of the checkpoint and of the export.
+    """
+    with torch.inference_mode():
+        expected = model(torch.as_tensor(observations, dtype=torch.float32))
+        exported = torch.cat([runtime.forward(torch.as_tensor(obs[None], dtype=torch.float32)) for obs in observations])
+    return float((expected - exported).abs().max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export PPO_POLICY.pt for CPU inference, optionally quantized, and benchmark the backends.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FOLDER, help="Folder holding PPO_POLICY.pt")
+    parser.add_argument("--obs-size", type=int, default=OBS_SIZE)
+    parser.add_argument("--onnx", action="store_true", help="Also export an ONNX graph")
+    parser.add_argument("--quantize", choices=list(QUANTIZED_POLICIES), action="append", default=[],
+                        help="Also export a quantized variant, can be given more than once")
+    parser.add_argument("--observations", nargs="*", default=[],
+                        help="Reward logs written with log_obs, used for the action agreement check instead of random observations")
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads used by the CPU runtime")
+    parser.add_argument("--benchmark", type=int, default=2000, help="Decisions timed per backend, 0 to skip")
+    args = parser.parse_args()
+
+    policy = load_model(args.checkpoint, args.obs_size)
+    model = policy.model
+    if args.observations:
+        observations = load_observations(args.observations, args.obs_size)
+    else:
+        observations = np.random.default_rng(0).normal(size=(max(args.benchmark, 100), args.obs_size)).astype(np.float32)
+
+    torchscript_path = os.path.join(args.checkpoint, TORCHSCRIPT_POLICY)
+    export_torchscript(model, args.obs_size, torchscript_path)
+    runtimes = {"torchscript-cpu": PolicyRuntime(torchscript_path, args.obs_size, args.threads)}
+    print(F"TorchScript policy written to {torchscript_path}")
+
+    if args.onnx:
+        onnx_path = os.path.join(args.checkpoint, ONNX_POLICY)
+        export_onnx(model, args.obs_size, onnx_path)
+        runtimes["onnx-cpu"] = OnnxPolicyRuntime(onnx_path, args.obs_size, args.threads)
+        print(F"ONNX policy written to {onnx_path}")
+
+    for variant in args.quantize:
+        quantized_path = os.path.join(args.checkpoint, QUANTIZED_POLICIES[variant])
+        export_quantized(model, variant, args.obs_size, quantized_path)
+        runtimes[F"{variant}-cpu"] = PolicyRuntime(quantized_path, args.obs_size, args.threads)
+        print(F"{variant} policy written to {quantized_path}")
+
+    for name, runtime in runtimes.items():
+        print(F"{name}: max logits difference {check_export(model, runtime, observations[:100]):.3e}")
+        agreement, head_agreement = action_agreement(model, runtime, observations)
+        print(F"  argmax action agreement over {len(observations)} observations: {agreement:.4f} "
+              F"(per head: {', '.join(F'{a:.4f}' for a in head_agreement)})")
+
+    if args.benchmark <= 0:
+        return
+
+    policies = {"eager-cpu": policy, **runtimes}
+    if torch.cuda.is_available():
+        policies["eager-cuda"] = load_policy(args.checkpoint, args.obs_size, device="cuda")
+
+    print(F"Latency per decision over {args.benchmark} decisions (us):")
+    for name, policy in policies.items():
+        stats = benchmark_latency(policy, observations[:args.benchmark])
+        print(F"  {name:<16} p50={stats['p50']:8.1f} p99={stats['p99']:8.1f} mean={stats['mean']:8.1f} max={stats['max']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import pathlib
+import queue
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+import torch
+
+from policy_runtime import BINS, PolicyRuntime, load_policy
+
+DEFAULT_ADDRESS = ("localhost", 52525)
+DEFAULT_AUTHKEY = b"softkick"
+OBS_SIZE = 89
+CHECKPOINT_FOLDER = str(pathlib.Path(__file__).parent.resolve() / "checkpoint")
+
+
+def sample_heads(logits: torch.Tensor, deterministic: bool = False, generator: torch.Generator = None) -> torch.Tensor:
+    """
+    Function that samples the bin of every head for a batch of flat logits of shape (n, sum(BINS)), like
+    MultiDiscreteFF.get_action does for one observation.
+
+    :return: An int64 tensor of shape (n, len(BINS)).
+    """
+    n_triplets = BINS.count(3)
+    split = 3 * n_triplets
+    padded = torch.full((len(logits), len(BINS), max(BINS)), float("-inf"), dtype=logits.dtype)
+    padded[:, :n_triplets] = logits[:, :split].reshape(-1, n_triplets, 3)
+    padded[:, n_triplets:, :2] = logits[:, split:].reshape(-1, len(BINS) - n_triplets, 2)
+    if deterministic:
+        return padded.argmax(dim=-1)
+    probs = torch.softmax(padded, dim=-1).reshape(-1, max(BINS))
+    return torch.multinomial(probs, 1, generator=generator).reshape(len(logits), len(BINS))
+
+
+class InferenceServer(object):
+    """
+    Serves one policy to many bot processes. Every connection gets a reader thread, the requests are gathered by a
+    batching thread for up to `window` seconds (or `max_batch` requests) and answered with one forward pass.
+    """
+
+    def __init__(self, policy, obs_size: int, address=DEFAULT_ADDRESS, authkey: bytes = DEFAULT_AUTHKEY,
+                 window: float = 0.001, max_batch: int = 64, deterministic: bool = False):
+        """
+        :param policy: PolicyRuntime or MultiDiscreteFF returned by policy_runtime.load_policy.
+        :param obs_size: Length of the observations sent by the clients.
+        :param address: Address to listen on, a (host, port) tuple or a Unix socket path.
+        :param window: Seconds the batching thread waits for more requests after the first one.
+        :param max_batch: Maximum number of observations per forward pass.
+        """
+        self.policy = policy
+        self.obs_size = obs_size
+        self.window = window
+        self.max_batch = max_batch
+        self.deterministic = deterministic
+        self.listener = Listener(address, authkey=authkey)
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.served = 0
+
+    def serve_forever(self):
+        threading.Thread(target=self._batch_loop, name="InferenceBatcher", daemon=True).start()
+        print(F"Inference server listening on {self.listener.address}")
+        while True:
+            connection = self.listener.accept()
+            threading.Thread(target=self._read_loop, args=(connection,), name="InferenceClient", daemon=True).start()
+
+    def _read_loop(self, connection):
+        try:
+            while True:
+                obs = np.frombuffer(connection.recv_bytes(), dtype=np.float32)
+                if len(obs) != self.obs_size:
+                    # Checked here, a bad row would make the batcher fail the whole batch
+                    print(F"Closing a client that sent {len(obs)} values instead of {self.obs_size}")
+                    break
+                self.requests.put((connection, obs))
+        except (EOFError, OSError):
+            pass
+        connection.close()
+
+    def _forward(self, obs: np.ndarray) -> torch.Tensor:
+        with torch.inference_mode():
+            if isinstance(self.policy, PolicyRuntime):
+                logits = self.policy.forward(torch.from_numpy(obs))
+            else:
+                logits = self.policy.get_output(obs) # Moved to the device of the policy
+            return sample_heads(logits.float().cpu(), self.deterministic)
+
+    def _batch_loop(self):
+        obs = np.zeros((self.max_batch, self.obs_size), dtype=np.float32)
+        while True:
+            connections = []
+            connection, obs[0] = self.requests.get()
+            connections.append(connection)
+            deadline = time.perf_counter() + self.window
+            while len(connections) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    connection, obs[len(connections)] = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                connections.append(connection)
+
+            try:
+                actions = self._forward(obs[:len(connections)]).numpy()
+                # A policy answering fewer rows would leave the other bots waiting on their socket forever
+                assert len(actions) == len(connections), f"{len(actions)} actions for a batch of {len(connections)}"
+            except Exception:
+                # This thread serves every bot, so it outlives a failed batch. The bots of the batch get their
+                # connection closed instead of an answer, rather than waiting on it forever
+                traceback.print_exc()
+                for connection in connections:
+                    connection.close()
+                continue
+            for connection, action in zip(connections, actions):
+                try:
+                    connection.send_bytes(action.tobytes())
+                except OSError:
+                    pass # The bot is gone, its reader thread closes the connection
+            self.batches += 1
+            self.served += len(connections)
+
+
+class InferenceClient(object):
+    """
+    Drop-in for the policy of the bot, forwarding every observation to an InferenceServer.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey: bytes = DEFAULT_AUTHKEY):
+        self.connection = Client(address, authkey=authkey)
+
+    def get_action(self, obs: np.ndarray):
+        """
+        :return: A tuple with the bin of every head as an int64 tensor of shape (8,) and 0, as MultiDiscreteFF does.
+        """
+        self.connection.send_bytes(np.asarray(obs, dtype=np.float32).tobytes())
+        return torch.from_numpy(np.frombuffer(self.connection.recv_bytes(), dtype=np.int64).copy()), 0
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve PPO_POLICY.pt to every SoftKick bot of this machine.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FOLDER, help="Folder holding PPO_POLICY.pt")
+    parser.add_argument("--obs-size", type=int, default=OBS_SIZE)
+    parser.add_argument("--host", default=DEFAULT_ADDRESS[0])
+    parser.add_argument("--port", type=int, default=DEFAULT_ADDRESS[1])
+    parser.add_argument("--socket", default=None, help="Listen on this Unix socket instead of host:port")
+    parser.add_argument("--device", default=None, help="cuda or cpu, CUDA when available by default")
+    parser.add_argument("--variant", default=None, help="int8 or bf16 to serve a quantized export")
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads used for CPU inference")
+    parser.add_argument("--window-ms", type=float, default=1.0, help="Time waited for more requests per batch")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--deterministic", action="store_true", help="Pick the most likely bin of every head")
+    args = parser.parse_args()
+
+    policy = load_policy(args.checkpoint, args.obs_size, args.device, args.threads, args.variant)
+    address = args.socket if args.socket else (args.host, args.port)
+    server = InferenceServer(policy, args.obs_size, address, window=args.window_ms / 1000,
+                             max_batch=args.max_batch, deterministic=args.deterministic)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
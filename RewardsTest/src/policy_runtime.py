@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+
+import numpy as np
+import torch
+
+# Bins of the MultiDiscreteFF policy heads, matching the rlgym_action_parser.DiscreteAction inputs
+BINS = (3, 3, 3, 3, 3, 2, 2, 2)
+LAYER_SIZES = (1024, 512, 512, 512)
+
+POLICY_CHECKPOINT = "PPO_POLICY.pt"
+TORCHSCRIPT_POLICY = "PPO_POLICY.ts"
+ONNX_POLICY = "PPO_POLICY.onnx"
+# Quantized TorchScript exports, see export_policy.py --quantize
+QUANTIZED_POLICIES = {
+    "int8": "PPO_POLICY_int8.ts",
+    "bf16": "PPO_POLICY_bf16.ts",
+}
+
+
+class PolicyRuntime(object):
+    """
+    CPU inference for a policy exported by export_policy.py. The observation is copied into a preallocated input
+    tensor and the actions are sampled like MultiDiscreteFF.get_action, so it is a drop-in for the bot.
+    """
+
+    def __init__(self, model_path: str, obs_size: int, n_threads: int = 1, deterministic: bool = False,
+                 seed: int = None):
+        """
+        :param model_path: TorchScript graph written by export_policy.py.
+        :param obs_size: Length of the observations given to get_action.
+        :param n_threads: Number of threads used by torch for the forward pass of this process.
+        :param deterministic: Pick the most likely bin of every head instead of sampling.
+        :param seed: Seed of the sampling generator, None for a random one.
+        """
+        torch.set_num_threads(n_threads)
+        self.model = self._load(model_path)
+        self.obs_size = obs_size
+        self.deterministic = deterministic
+        self.generator = torch.Generator()
+        if seed is not None:
+            self.generator.manual_seed(seed)
+        else:
+            self.generator.seed()
+
+        # The numpy view shares its memory with the tensor, writing into it costs no allocation
+        self.input = torch.zeros((1, obs_size), dtype=torch.float32)
+        self._input_np = self.input.numpy()
+        # Logits laid out as (head, bin), the heads with two bins are padded with -inf like MultiDiscreteRolv
+        self.logits = torch.full((len(BINS), max(BINS)), float("-inf"))
+        self._n_triplets = BINS.count(3)
+        self.action = torch.zeros(len(BINS), dtype=torch.int64)
+
+    def _load(self, model_path: str):
+        model = torch.jit.load(model_path, map_location="cpu")
+        model.eval()
+        return model
+
+    def forward(self, obs: torch.Tensor) -> torch.Tensor:
+        return self.model(obs)
+
+    def get_action(self, obs: np.ndarray, deterministic: bool = None):
+        """
+        Function that samples an action for one observation.
+
+        :return: A tuple with the bin of every head as an int64 tensor of shape (8,) and 0, as MultiDiscreteFF does
+        for the log probability. The tensor is reused by the next call.
+        """
+        self._input_np[0] = obs
+        with torch.inference_mode():
+            self._fill_logits(self.forward(self.input)[0])
+            if self.deterministic if deterministic is None else deterministic:
+                torch.argmax(self.logits, dim=-1, out=self.action)
+            else:
+                probs = torch.softmax(self.logits, dim=-1)
+                self.action[:] = torch.multinomial(probs, 1, generator=self.generator)[:, 0]
+        return self.action, 0
+
+    def _fill_logits(self, flat_logits: torch.Tensor):
+        split = 3 * self._n_triplets
+        self.logits[:self._n_triplets] = flat_logits[:split].view(self._n_triplets, 3)
+        self.logits[self._n_triplets:, :2] = flat_logits[split:].view(-1, 2)
+
+
+class OnnxPolicyRuntime(PolicyRuntime):
+    """
+    PolicyRuntime running an ONNX graph with onnxruntime on the CPU.
+    """
+
+    def _load(self, model_path: str):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = torch.get_num_threads()
+        return onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+    def forward(self, obs: torch.Tensor) -> torch.Tensor:
+        # For the input tensor of get_action, the numpy array is a view of its memory and nothing is copied
+        obs = obs.cpu().numpy().astype(np.float32, copy=False)
+        return torch.from_numpy(self.model.run(None, {"obs": obs})[0])
+
+
+class AsyncPolicy(object):
+    """
+    Runs the forward passes of a policy on a background thread. `submit` hands over an observation and returns at
+    once, `poll` returns the action once it is ready. Only the latest observation is kept: submitting while the
+    thread is busy replaces the one still waiting.
+    """
+
+    def __init__(self, policy, obs_size: int):
+        """
+        :param policy: PolicyRuntime or MultiDiscreteFF, anything with a get_action(obs) method.
+        :param obs_size: Length of the submitted observations.
+        """
+        self.policy = policy
+        self._obs = np.zeros(obs_size, dtype=np.float32)
+        self._pending_tick = None
+        self._result = None
+        self._running = True
+        self._condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="PolicyInference", daemon=True)
+        self.thread.start()
+
+    def submit(self, obs: np.ndarray, tick: int):
+        """
+        Function that queues an observation, copied since the caller usually reuses its buffer.
+
+        :param tick: Tick the observation was built on, returned with its action.
+        """
+        with self._condition:
+            self._obs[:] = obs
+            self._pending_tick = tick
+            self._condition.notify()
+
+    def poll(self):
+        """
+        Function that returns the latest action that was not polled yet.
+
+        :return: A tuple with the bins of every head as a numpy array and the tick of its observation, or None.
+        """
+        with self._condition:
+            result, self._result = self._result, None
+        return result
+
+    def _run(self):
+        obs = np.empty_like(self._obs)
+        while True:
+            with self._condition:
+                while self._pending_tick is None and self._running:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                obs[:] = self._obs
+                tick, self._pending_tick = self._pending_tick, None
+
+            action, _ = self.policy.get_action(obs)
+            # PolicyRuntime reuses its action tensor, the result must outlive the next forward pass
+            action = np.array(action.cpu().numpy())
+            with self._condition:
+                self._result = (action, tick)
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self.thread.join()
+
+
+def head_argmax(logits: np.ndarray) -> np.ndarray:
+    """
+    Function that returns the most likely bin of every head for a batch of flat logits of shape (n, sum(BINS)).
+    """
+    logits = np.asarray(logits)
+    splits = np.cumsum(BINS)[:-1]
+    return np.stack([head.argmax(axis=-1) for head in np.split(logits, splits, axis=-1)], axis=-1)
+
+
+def load_policy(checkpoint_folder: str, obs_size: int, device: str = None, n_threads: int = 1, variant: str = None):
+    """
+    Function that loads the policy of the bot on the best available backend. On CUDA, or when no exported graph is
+    found, the MultiDiscreteFF checkpoint is used. On CPU, the TorchScript then the ONNX export are preferred.
+
+    :param checkpoint_folder: Folder holding PPO_POLICY.pt and its exports.
+    :param obs_size: Length of the observations of the bot.
+    :param device: "cuda" or "cpu", None picks CUDA when available.
+    :param n_threads: Number of torch threads used for CPU inference.
+    :param variant: "int8" or "bf16" to run a quantized export on the CPU, whatever the device.
+    """
+    if variant is not None:
+        return PolicyRuntime(os.path.join(checkpoint_folder, QUANTIZED_POLICIES[variant]), obs_size, n_threads)
+
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    if device == "cpu":
+        torchscript_path = os.path.join(checkpoint_folder, TORCHSCRIPT_POLICY)
+        onnx_path = os.path.join(checkpoint_folder, ONNX_POLICY)
+        if os.path.exists(torchscript_path):
+            return PolicyRuntime(torchscript_path, obs_size, n_threads)
+        if os.path.exists(onnx_path):
+            return OnnxPolicyRuntime(onnx_path, obs_size, n_threads)
+        torch.set_num_threads(n_threads)
+
+    from rlgym_ppo.ppo import MultiDiscreteFF
+
+    policy = MultiDiscreteFF(obs_size, LAYER_SIZES, device).to(device)
+    policy.load_state_dict(torch.load(os.path.join(checkpoint_folder, POLICY_CHECKPOINT), map_location=device))
+    policy.eval()
+    return policy
+
+
+def benchmark_latency(policy, observations: np.ndarray, warmup: int = 100) -> dict:
+    """
+    Function that times one get_action call per observation, the way the bot calls it, including the copy of the
+    action back to numpy.
+
+    :return: A dict with the p50, p99, mean and max latency per decision in microseconds.
+    """
+    for obs in observations[:warmup]:
+        policy.get_action(obs)
+
+    timings = np.empty(len(observations))
+    for i, obs in enumerate(observations):
+        start = time.perf_counter_ns()
+        action, _ = policy.get_action(obs)
+        action.cpu().numpy()
+        timings[i] = time.perf_counter_ns() - start
+
+    timings /= 1000
+    return {
+        "p50": np.percentile(timings, 50),
+        "p99": np.percentile(timings, 99),
+        "mean": timings.mean(),
+        "max": timings.max(),
+    }
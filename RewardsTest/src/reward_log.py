@@ -0,0 +1,225 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"SKRWLOG1"
+HEADER_ALIGNMENT = 64
+DEFAULT_BUFFER_RECORDS = 4096
+
+
+def record_dtype(obs_size: int = 0, action_size: int = 0) -> np.dtype:
+    """
+    Function that returns the structured type of a reward log record.
+
+    :param obs_size: Length of the observation stored with every record, 0 to leave it out.
+    :param action_size: Length of the action stored with every record, 0 to leave it out.
+    """
+    fields = [
+        ("tick", np.int64),
+        ("player", np.int32),
+        ("done", np.bool_),
+        ("reward", np.float64),
+    ]
+    if obs_size > 0:
+        fields.append(("obs", np.float32, (obs_size,)))
+    if action_size > 0:
+        fields.append(("action", np.float32, (action_size,)))
+    return np.dtype(fields)
+
+
+def _encode_header(dtype: np.dtype, metadata: dict) -> bytes:
+    header = json.dumps({
+        "version": 1,
+        "descr": np.lib.format.dtype_to_descr(dtype),
+        "metadata": metadata,
+    }).encode()
+    # The records start on an aligned offset, so the file can be memory mapped as is
+    length = len(MAGIC) + 4 + len(header)
+    header += b" " * (-length % HEADER_ALIGNMENT)
+    return MAGIC + len(header).to_bytes(4, "little") + header
+
+
+def read_header(file_path) -> tuple:
+    """
+    Function that reads the header of a reward log.
+
+    :return: A tuple with the record type, the metadata dict and the offset of the first record.
+    """
+    with open(file_path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{file_path} is not a reward log")
+        length = int.from_bytes(f.read(4), "little")
+        header = json.loads(f.read(length))
+    dtype = np.lib.format.descr_to_dtype(header["descr"])
+    return dtype, header["metadata"], len(MAGIC) + 4 + length
+
+
+def read_reward_log(file_path) -> np.ndarray:
+    """
+    Function that memory maps the records of a reward log. A record cut short by a crash is left out.
+
+    :return: A read-only structured array with the fields of record_dtype.
+    """
+    dtype, _, offset = read_header(file_path)
+    n_records = (os.path.getsize(file_path) - offset) // dtype.itemsize
+    if n_records == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode="r", offset=offset, shape=(n_records,))
+
+
+class RewardLogWriter(object):
+    """
+    Appends fixed-size binary records to a reward log. Records are buffered in a preallocated structured array and
+    written in one call once `buffer_records` of them are pending, so logging costs no syscall on most ticks.
+    """
+
+    def __init__(self, file_path, obs_size: int = 0, action_size: int = 0,
+                 buffer_records: int = DEFAULT_BUFFER_RECORDS, metadata: dict = None):
+        """
+        :param file_path: Log to append to. An existing log must have been written with the same obs and action sizes.
+        :param obs_size: Length of the observation stored with every record, 0 to leave it out.
+        :param action_size: Length of the action stored with every record, 0 to leave it out.
+        :param buffer_records: Number of records kept in memory before they are written.
+        :param metadata: JSON serializable dict stored in the header of a new log (gamma, tick skip...).
+        """
+        self.dtype = record_dtype(obs_size, action_size)
+        self.file_path = file_path
+        self.buffer = np.zeros(buffer_records, dtype=self.dtype)
+        self.pending = 0
+        self.written = 0
+
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            dtype, _, offset = read_header(file_path)
+            if dtype != self.dtype:
+                raise ValueError(f"{file_path} holds records of type {dtype}, not {self.dtype}")
+            # Drop a record cut short by a crash, the next ones would be misaligned otherwise
+            size = os.path.getsize(file_path)
+            complete = offset + (size - offset) // dtype.itemsize * dtype.itemsize
+            if complete != size:
+                os.truncate(file_path, complete)
+            self.fp = open(file_path, "ab")
+        else:
+            self.fp = open(file_path, "wb")
+            self.fp.write(_encode_header(self.dtype, metadata or {}))
+
+    def write(self, tick: int, player: int, reward: float, done: bool, obs: np.ndarray = None,
+              action: np.ndarray = None):
+        record = self.buffer[self.pending]
+        record["tick"] = tick
+        record["player"] = player
+        record["reward"] = reward
+        record["done"] = done
+        if obs is not None and "obs" in self.dtype.names:
+            record["obs"] = obs
+        if action is not None and "action" in self.dtype.names:
+            record["action"] = action
+
+        self.pending += 1
+        if self.pending == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.pending == 0 or self.fp is None:
+            return
+        self.fp.write(self.buffer[:self.pending].tobytes())
+        self.fp.flush()
+        self.written += self.pending
+        self.pending = 0
+
+    def close(self):
+        if self.fp is None:
+            return
+        self.flush()
+        self.fp.close()
+        self.fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AsyncRewardLogWriter(object):
+    """
+    RewardLogWriter driven by a background thread. `write` only pushes the record on a bounded queue, the thread
+    drains it and does every file operation, so a disk stall never delays the caller. When the queue is full the
+    record is dropped and counted in `dropped` instead of blocking.
+    """
+
+    def __init__(self, file_path, obs_size: int = 0, action_size: int = 0,
+                 buffer_records: int = DEFAULT_BUFFER_RECORDS, metadata: dict = None,
+                 queue_size: int = 8192, flush_interval: float = 5.0):
+        """
+        :param queue_size: Maximum number of records waiting for the background thread.
+        :param flush_interval: Maximum number of seconds a record waits in memory before it is written, whether or
+        not new records keep arriving.
+
+        The other parameters are the ones of RewardLogWriter.
+        """
+        self.writer = RewardLogWriter(file_path, obs_size, action_size, buffer_records, metadata)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._drain, name="RewardLogWriter", daemon=True)
+        self.thread.start()
+
+    @property
+    def written(self) -> int:
+        return self.writer.written
+
+    def write(self, tick: int, player: int, reward: float, done: bool, obs: np.ndarray = None,
+              action: np.ndarray = None):
+        if self.closed:
+            return
+        # Observations and actions usually live in reused buffers, so they are copied before leaving this thread
+        names = self.writer.dtype.names
+        obs = np.array(obs, dtype=np.float32) if obs is not None and "obs" in names else None
+        action = np.array(action, dtype=np.float32) if action is not None and "action" in names else None
+        try:
+            self.queue.put_nowait((tick, player, reward, done, obs, action))
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self.queue.get(timeout=max(next_flush - time.monotonic(), 0.0))
+            except queue.Empty:
+                record = ()
+            if record is None:
+                break
+            if record:
+                self.writer.write(*record)
+            # Also flushed during continuous play, so a crash loses at most flush_interval seconds of records
+            if time.monotonic() >= next_flush:
+                self.writer.flush()
+                next_flush = time.monotonic() + self.flush_interval
+        self.writer.close()
+
+    def close(self, timeout: float = 10.0) -> bool:
+        """
+        Stops the background thread once the queued records are written and closes the log.
+
+        :param timeout: Seconds to wait for the thread, e.g. when the disk stalls with a full queue.
+
+        :return: True if the log was closed, False if the thread was still busy after `timeout` seconds. The records
+        it has not written yet are then lost when the process exits.
+        """
+        if self.closed:
+            return not self.thread.is_alive()
+        self.closed = True
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return False
+        self.thread.join(max(deadline - time.monotonic(), 0.0))
+        return not self.thread.is_alive()
@@ -4,6 +4,7 @@ from typing import Any, Dict, List, Tuple, Union
 import gym.spaces
 import numpy as np
 
+from action_table import LookupTable, curated_actions, make_control_table
 from rlgym_compat import GameState, PlayerData
 
 
@@ -56,3 +57,9 @@ class DiscreteAction(ActionParser):
         actions[..., :5] = actions[..., :5] / (self._n_bins // 2) - 1
 
         return actions
+
+
+class LookupTableAction(LookupTable, ActionParser):
+    """
+    DiscreteAction backed by a precomputed control table, see action_table.py.
+    """
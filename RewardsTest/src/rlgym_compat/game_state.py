@@ -1,22 +1,38 @@
+import ctypes
+import math
 import numpy as np
 from typing import List, Optional
 
 from rlbot.utils.structures.game_data_struct import GameTickPacket, FieldInfoPacket, PlayerInfo
 
-from .physics_object import PhysicsObject
-from .player_data import PlayerData
+from .physics_object import PhysicsObject, EULER_ANGLES, PHYSICS_LENGTH, PHYSICS_SIZE
+from .player_data import PlayerData, PlayerDataView, BALL_TOUCHED, BOOST_AMOUNT, BOOST_PICKUPS, PLAYER_LENGTH
+
+MAX_CARS = 64
+
+# Mirrors a physics row to the orange point of view: x/y of every vector are flipped and yaw is rotated by pi
+_INVERT_PHYSICS_SCALE = np.asarray([-1, -1, 1, 1, 1, 1, -1, -1, 1, -1, -1, 1], dtype=np.float32)
+_INVERT_PHYSICS_OFFSET = np.asarray([0, 0, 0, 0, math.pi, 0, 0, 0, 0, 0, 0, 0], dtype=np.float32)
+# The same for every car row, sliced to the decoded cars: same-shape operands need no broadcasting buffer
+_INVERT_CARS_SCALE = np.tile(_INVERT_PHYSICS_SCALE, (MAX_CARS, 1))
+_INVERT_CARS_OFFSET = np.tile(_INVERT_PHYSICS_OFFSET, (MAX_CARS, 1))
 
 
 class GameState:
-    def __init__(self, game_info: FieldInfoPacket):
+    def __init__(self, game_info: FieldInfoPacket, preallocate: bool = False):
+        """
+        :param game_info: Field info of the current match.
+        :param preallocate: Decode into preallocated float32 arrays reused across ticks. Ball, cars and players are
+        then exposed as views into `ball_physics`, `car_physics` and `player_info` instead of new objects every tick.
+        """
         self.game_type: int = 0 # TODO: perhaps update this according to match settings
         self.blue_score = 0
         self.orange_score = 0
         self.last_touch: Optional[int] = -1
-        
+
         self.players: List[PlayerData] = []
-        self._on_ground_ticks = np.zeros(64)
-        self._air_time_since_jump = np.zeros(64)
+        self._on_ground_ticks = np.zeros(MAX_CARS)
+        self._air_time_since_jump = np.zeros(MAX_CARS)
 
         self.ball: PhysicsObject = PhysicsObject()
         self.inverted_ball: PhysicsObject = PhysicsObject()
@@ -25,6 +41,39 @@ class GameState:
         self.boost_pads: np.ndarray = np.zeros(game_info.num_boosts, dtype=np.float32)
         self.inverted_boost_pads: np.ndarray = np.zeros_like(self.boost_pads, dtype=np.float32)
 
+        self.preallocated = preallocate
+        if preallocate:
+            self._allocate_arrays()
+
+    def _allocate_arrays(self):
+        # One row per car, laid out as described in physics_object.py and player_data.py
+        self.ball_physics = np.zeros(PHYSICS_LENGTH, dtype=np.float32)
+        self.inverted_ball_physics = np.zeros(PHYSICS_LENGTH, dtype=np.float32)
+        self.car_physics = np.zeros((MAX_CARS, PHYSICS_LENGTH), dtype=np.float32)
+        self.inverted_car_physics = np.zeros((MAX_CARS, PHYSICS_LENGTH), dtype=np.float32)
+        self.player_info = np.zeros((MAX_CARS, PLAYER_LENGTH), dtype=np.float32)
+        # Rotation matrices of every car, computed lazily into these rows by the car views, one car at a time: at
+        # the car counts of a match, the scalar trigonometry is faster than one vectorized pass over every car
+        self.car_rotation = np.zeros((MAX_CARS, 3, 3))
+        self.inverted_car_rotation = np.zeros((MAX_CARS, 3, 3))
+
+        # Same defaults as a fresh PlayerData
+        self.player_info[:, :BOOST_PICKUPS + 1] = -1
+        self.player_info[:, BOOST_AMOUNT] = -1
+
+        # A Physics is 12 contiguous floats in the order of a physics row, so it is copied into its row as raw memory
+        self._ball_address = self.ball_physics.ctypes.data
+        self._car_addresses = [row.ctypes.data for row in self.car_physics]
+        self._ball_euler_angles = self.ball_physics[EULER_ANGLES]
+
+        self.ball = PhysicsObject.view(self.ball_physics)
+        self.inverted_ball = PhysicsObject.view(self.inverted_ball_physics)
+        self._player_views = []
+        for i in range(MAX_CARS):
+            car_data = PhysicsObject.view(self.car_physics[i], self.car_rotation[i])
+            inverted_car_data = PhysicsObject.view(self.inverted_car_physics[i], self.inverted_car_rotation[i], car_data)
+            self._player_views.append(PlayerDataView(self.player_info[i], car_data, inverted_car_data))
+
     def decode(self, packet: GameTickPacket, ticks_elapsed=1, tick_skip=8):
         self.blue_score = packet.teams[0].score
         self.orange_score = packet.teams[1].score
@@ -33,6 +82,10 @@ class GameState:
             self.boost_pads[i] = packet.game_boosts[i].is_active
         self.inverted_boost_pads[:] = self.boost_pads[::-1]
 
+        if self.preallocated:
+            self._decode_arrays(packet, ticks_elapsed, tick_skip)
+            return
+
         self.ball.decode_ball_data(packet.game_ball.physics)
         self.inverted_ball.invert(self.ball)
 
@@ -42,19 +95,70 @@ class GameState:
             player = self._decode_player(packet.game_cars[i], i, ticks_elapsed)
             if latest_touch.time_seconds > 0 and i == latest_touch.player_index and packet.game_info.seconds_elapsed - latest_touch.time_seconds < tick_skip / 120:
                 player.ball_touched = True
-            
+
             self.players.append(player)
-        
+
         if latest_touch.time_seconds > 0:
             self.last_touch = latest_touch.player_index
-        
 
-    def _decode_player(self, player_info: PlayerInfo, index: int, ticks_elapsed: int) -> PlayerData:
-        player_data = PlayerData()
+    def _decode_arrays(self, packet: GameTickPacket, ticks_elapsed: int, tick_skip: int):
+        ctypes.memmove(self._ball_address, ctypes.addressof(packet.game_ball.physics), PHYSICS_SIZE)
+        self._ball_euler_angles.fill(0) # The ball rotation is not decoded, as in PhysicsObject.decode_ball_data
+        np.multiply(self.ball_physics, _INVERT_PHYSICS_SCALE, out=self.inverted_ball_physics)
+        np.add(self.inverted_ball_physics, _INVERT_PHYSICS_OFFSET, out=self.inverted_ball_physics)
 
-        player_data.car_data.decode_car_data(player_info.physics)
-        player_data.inverted_car_data.invert(player_data.car_data)
+        num_cars = packet.num_cars
+        latest_touch = packet.game_ball.latest_touch
+        touched_index = -1
+        if latest_touch.time_seconds > 0 and packet.game_info.seconds_elapsed - latest_touch.time_seconds < tick_skip / 120:
+            touched_index = latest_touch.player_index
+
+        for i in range(num_cars):
+            player_info = packet.game_cars[i]
+            ctypes.memmove(self._car_addresses[i], ctypes.addressof(player_info.physics), PHYSICS_SIZE)
+            self._write_player(self.player_info[i], player_info, i, ticks_elapsed)
+            if i == touched_index:
+                self.player_info[i, BALL_TOUCHED] = 1
 
+        self._finish_cars(num_cars)
+
+        if latest_touch.time_seconds > 0:
+            self.last_touch = latest_touch.player_index
+
+    def _finish_cars(self, num_cars: int):
+        # Inverted rows of the decoded cars, and the player views over them
+        inverted_cars = self.inverted_car_physics[:num_cars]
+        np.multiply(self.car_physics[:num_cars], _INVERT_CARS_SCALE[:num_cars], out=inverted_cars)
+        np.add(inverted_cars, _INVERT_CARS_OFFSET[:num_cars], out=inverted_cars)
+        self._refresh_views(num_cars)
+
+    def _refresh_views(self, num_cars: int):
+        """
+        Points `players` to the views of the first `num_cars` rows and marks their rotation matrices as stale, once
+        the rows were rewritten.
+        """
+        if len(self.players) != num_cars:
+            self.players = self._player_views[:num_cars]
+        for player in self.players:
+            player.car_data.invalidate()
+            player.inverted_car_data.invalidate()
+
+    def rotation_matrices(self, inverted: bool = False) -> np.ndarray:
+        """
+        Returns the rotation matrices of every player's car as an array of shape (n_players, 3, 3), from the orange
+        point of view if `inverted`. With preallocate, this is a view into `car_rotation` or `inverted_car_rotation`,
+        where the stale matrices are computed first.
+        """
+        if self.preallocated:
+            for player in self.players:
+                (player.inverted_car_data if inverted else player.car_data).rotation_mtx()
+            rotations = self.inverted_car_rotation if inverted else self.car_rotation
+            return rotations[:len(self.players)]
+        if inverted:
+            return np.stack([player.inverted_car_data.rotation_mtx() for player in self.players])
+        return np.stack([player.car_data.rotation_mtx() for player in self.players])
+
+    def _update_air_time(self, player_info: PlayerInfo, index: int, ticks_elapsed: int):
         if player_info.has_wheel_contact:
             self._on_ground_ticks[index] = 0
             self._air_time_since_jump[index] = 0
@@ -63,6 +167,39 @@ class GameState:
             if player_info.jumped: # Technically this should only start when you stop holding jump
                 self._air_time_since_jump[index] += ticks_elapsed
 
+    def _write_player(self, row: np.ndarray, player_info: PlayerInfo, index: int, ticks_elapsed: int):
+        self._update_air_time(player_info, index, ticks_elapsed)
+
+        boost_amount = player_info.boost / 100
+        boost_pickups = row[BOOST_PICKUPS]
+        if row[BOOST_AMOUNT] < boost_amount: # Rows persist across ticks, so pickups are actually counted here
+            boost_pickups = 1 if boost_pickups == -1 else boost_pickups + 1
+
+        score_info = player_info.score_info
+        row[:] = (
+            index,
+            player_info.team,
+            score_info.goals,
+            score_info.saves,
+            score_info.shots,
+            score_info.demolitions,
+            boost_pickups,
+            player_info.is_demolished,
+            player_info.has_wheel_contact or self._on_ground_ticks[index] <= 6,
+            False,
+            not player_info.jumped,
+            self._air_time_since_jump[index] < 150 and not player_info.double_jumped,
+            boost_amount,
+        )
+
+    def _decode_player(self, player_info: PlayerInfo, index: int, ticks_elapsed: int) -> PlayerData:
+        player_data = PlayerData()
+
+        player_data.car_data.decode_car_data(player_info.physics)
+        player_data.inverted_car_data.invert(player_data.car_data)
+
+        self._update_air_time(player_info, index, ticks_elapsed)
+
         player_data.car_id = index
         player_data.team_num = player_info.team
         player_data.match_goals = player_info.score_info.goals
@@ -81,4 +218,4 @@ class GameState:
         player_data.has_flip = self._air_time_since_jump[index] < 150 and not player_info.double_jumped
         player_data.boost_amount = player_info.boost / 100
 
-        return player_data
\ No newline at end of file
+        return player_data
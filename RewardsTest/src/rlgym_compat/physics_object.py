@@ -1,7 +1,29 @@
+import ctypes
 import math
 import numpy as np
 from rlbot.utils.structures.game_data_struct import Physics, Vector3, Rotator
 
+# Layout of a physics row in the preallocated GameState arrays: position, pitch/yaw/roll, linear and angular velocity
+POSITION = slice(0, 3)
+EULER_ANGLES = slice(3, 6)
+LINEAR_VELOCITY = slice(6, 9)
+ANGULAR_VELOCITY = slice(9, 12)
+PHYSICS_LENGTH = 12
+# Bytes of a physics row, which is also the size of an RLBot Physics: 12 contiguous floats in the same order
+PHYSICS_SIZE = PHYSICS_LENGTH * 4
+
+assert ctypes.sizeof(Physics) == PHYSICS_SIZE, "Physics is expected to be 12 contiguous floats"
+
+# Mirroring the yaw by pi negates its cosine and sine, which flips the x and y rows of the rotation matrix
+_INVERT_ROWS = np.asarray([-1, -1, 1], dtype=np.float64)[:, None]
+
+
+def invert_rotation(rotation_mtx: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Returns the rotation matrices of the inverted objects, i.e. with the yaw rotated by pi, from the original ones.
+    """
+    return np.multiply(rotation_mtx, _INVERT_ROWS, out=out)
+
 
 class PhysicsObject:
     def __init__(self, position=None, euler_angles=None, linear_velocity=None, angular_velocity=None):
@@ -14,18 +36,55 @@ class PhysicsObject:
         self.angular_velocity: np.ndarray = angular_velocity if angular_velocity else np.zeros(3)
         self._euler_angles: np.ndarray = euler_angles if euler_angles else np.zeros(3)
         self._rotation_mtx: np.ndarray = np.zeros((3,3))
-        self._has_computed_rot_mtx = False
+
+        # The cached matrix is valid while _rot_mtx_version matches _version, which every decode/invert bumps
+        self._version = 0
+        self._rot_mtx_version = -1
+        # Object this one was inverted from, its matrix is derived from the source one with a sign flip
+        self._rotation_source = None
+        # (3, 3) array owned by the GameState the matrix is computed into, None to allocate a new one
+        self._rotation_out = None
 
         self._invert_vec = np.asarray([-1, -1, 1])
         self._invert_pyr = np.asarray([0, math.pi, 0])
 
+    @classmethod
+    def view(cls, data: np.ndarray, rotation_mtx: np.ndarray = None, rotation_source=None):
+        """
+        Builds a PhysicsObject whose vectors are views into a physics row laid out as described at the top of this
+        module. Writes to the row are seen through the object without any copy. The rotation matrix is still computed
+        on the first rotation_mtx() call after invalidate(), which the owner of the row calls once it is rewritten.
+
+        :param data: Array of length PHYSICS_LENGTH the object will read from.
+        :param rotation_mtx: (3, 3) array the matrix is computed into, a new one is allocated if None.
+        :param rotation_source: Object this row is the inverted row of, the matrix is then derived from its matrix.
+        """
+        obj = cls()
+        obj.position = data[POSITION]
+        obj._euler_angles = data[EULER_ANGLES]
+        obj.linear_velocity = data[LINEAR_VELOCITY]
+        obj.angular_velocity = data[ANGULAR_VELOCITY]
+        obj._rotation_out = rotation_mtx
+        obj._rotation_source = rotation_source
+        return obj
+
+    def invalidate(self):
+        """
+        Marks the cached rotation matrix as stale, for objects whose arrays were modified in place.
+        """
+        self._version += 1
+
     def decode_car_data(self, car_data: Physics):
+        self.invalidate()
+        self._rotation_source = None
+        self._rotation_out = None
         self.position = self._vector_to_numpy(car_data.location)
         self._euler_angles = self._rotator_to_numpy(car_data.rotation)
         self.linear_velocity = self._vector_to_numpy(car_data.velocity)
         self.angular_velocity = self._vector_to_numpy(car_data.angular_velocity)
 
     def decode_ball_data(self, ball_data: Physics):
+        self.invalidate()
         self.position = self._vector_to_numpy(ball_data.location)
         self.linear_velocity = self._vector_to_numpy(ball_data.velocity)
         self.angular_velocity = self._vector_to_numpy(ball_data.angular_velocity)
@@ -35,6 +94,9 @@ class PhysicsObject:
         self._euler_angles = other.euler_angles() + self._invert_pyr
         self.linear_velocity = other.linear_velocity * self._invert_vec
         self.angular_velocity = other.angular_velocity * self._invert_vec
+        self.invalidate()
+        self._rotation_source = other
+        self._rotation_out = None
 
     # pitch, yaw, roll
     def euler_angles(self) -> np.ndarray:
@@ -50,9 +112,12 @@ class PhysicsObject:
         return self._euler_angles[2]
 
     def rotation_mtx(self) -> np.ndarray:
-        if not self._has_computed_rot_mtx:
-            self._rotation_mtx = self._euler_to_rotation(self._euler_angles)
-            self._has_computed_rot_mtx = True
+        if self._rot_mtx_version != self._version:
+            if self._rotation_source is not None:
+                self._rotation_mtx = invert_rotation(self._rotation_source.rotation_mtx(), out=self._rotation_out)
+            else:
+                self._rotation_mtx = self._euler_to_rotation(self._euler_angles, out=self._rotation_out)
+            self._rot_mtx_version = self._version
 
         return self._rotation_mtx
 
@@ -74,7 +139,7 @@ class PhysicsObject:
     def _rotator_to_numpy(self, rotator: Rotator):
         return np.asarray([rotator.pitch, rotator.yaw, rotator.roll])
 
-    def _euler_to_rotation(self, pyr: np.ndarray):
+    def _euler_to_rotation(self, pyr: np.ndarray, out: np.ndarray = None):
         CP = math.cos(pyr[0])
         SP = math.sin(pyr[0])
         CY = math.cos(pyr[1])
@@ -82,7 +147,7 @@ class PhysicsObject:
         CR = math.cos(pyr[2])
         SR = math.sin(pyr[2])
 
-        theta = np.empty((3, 3))
+        theta = np.empty((3, 3)) if out is None else out
 
         # front direction
         theta[0, 0] = CP * CY
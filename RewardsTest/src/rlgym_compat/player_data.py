@@ -1,5 +1,23 @@
+import numpy as np
+
 from .physics_object import PhysicsObject
 
+# Layout of a player row in the preallocated GameState arrays
+CAR_ID = 0
+TEAM_NUM = 1
+MATCH_GOALS = 2
+MATCH_SAVES = 3
+MATCH_SHOTS = 4
+MATCH_DEMOLISHES = 5
+BOOST_PICKUPS = 6
+IS_DEMOED = 7
+ON_GROUND = 8
+BALL_TOUCHED = 9
+HAS_JUMP = 10
+HAS_FLIP = 11
+BOOST_AMOUNT = 12
+PLAYER_LENGTH = 13
+
 
 class PlayerData(object):
     def __init__(self):
@@ -18,3 +36,40 @@ class PlayerData(object):
         self.boost_amount: float = -1
         self.car_data: PhysicsObject = PhysicsObject()
         self.inverted_car_data: PhysicsObject = PhysicsObject()
+
+
+def _row_field(index: int, cast):
+    def getter(self):
+        return cast(self._data[index])
+
+    def setter(self, value):
+        self._data[index] = value
+
+    return property(getter, setter)
+
+
+class PlayerDataView(PlayerData):
+    """
+    PlayerData backed by a player row of a preallocated GameState. Scalar fields are read from and written to that
+    row, car_data and inverted_car_data are PhysicsObject views into the matching physics rows.
+    """
+
+    car_id = _row_field(CAR_ID, int)
+    team_num = _row_field(TEAM_NUM, int)
+    match_goals = _row_field(MATCH_GOALS, int)
+    match_saves = _row_field(MATCH_SAVES, int)
+    match_shots = _row_field(MATCH_SHOTS, int)
+    match_demolishes = _row_field(MATCH_DEMOLISHES, int)
+    boost_pickups = _row_field(BOOST_PICKUPS, int)
+    is_demoed = _row_field(IS_DEMOED, bool)
+    on_ground = _row_field(ON_GROUND, bool)
+    ball_touched = _row_field(BALL_TOUCHED, bool)
+    has_jump = _row_field(HAS_JUMP, bool)
+    has_flip = _row_field(HAS_FLIP, bool)
+    boost_amount = _row_field(BOOST_AMOUNT, float)
+
+    def __init__(self, data: np.ndarray, car_data: PhysicsObject, inverted_car_data: PhysicsObject):
+        # PlayerData.__init__ is skipped on purpose, it would overwrite the shared row with its defaults
+        self._data = data
+        self.car_data = car_data
+        self.inverted_car_data = inverted_car_data
@@ -5,9 +5,12 @@
 # 3) we can import it into your module module
 # https://stackoverflow.com/questions/458550/standard-way-to-embed-version-into-python-package
 
-__version__ = '1.1.1'
+__version__ = '1.2.0'
 
 release_notes = {
+    '1.2.0': """
+    - Added preallocated decode mode, ball, cars and players become views into reused float32 arrays
+    """,
     '1.1.1': """
     - Added additional properties, make has_jump more accurate
     """,
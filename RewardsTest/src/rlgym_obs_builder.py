@@ -5,6 +5,7 @@ from typing import Any, List
 import gym
 import numpy as np
 
+from batch_obs import BatchObs, ObsLayout, CAR_OBS_LENGTH
 from rlgym_compat import GameState, PlayerData, common_values
 
 
@@ -61,25 +62,33 @@ class ObsBuilder(ABC):
         raise NotImplementedError
 
 
-class DefaultObs(ObsBuilder):
+class DefaultObs(BatchObs, ObsBuilder):
     def __init__(
         self,
         pos_coef=1 / 2300,
         ang_coef=1 / math.pi,
         lin_vel_coef=1 / 2300,
         ang_vel_coef=1 / math.pi,
+        preallocate=False,
+        copy_obs=False,
     ):
         """
         :param pos_coef: Position normalization coefficient
         :param ang_coef: Rotation angle normalization coefficient
         :param lin_vel_coef: Linear velocity normalization coefficient
         :param ang_vel_coef: Angular velocity normalization coefficient
+        :param preallocate: Write observations in place into a buffer owned by the builder, laid out as in ObsLayout.
+        The same buffer is returned on every call, so it is only valid until the next build_obs.
+        :param copy_obs: Return a copy of the buffer instead of the buffer itself when preallocating.
         """
         super().__init__()
         self.POS_COEF = pos_coef
         self.ANG_COEF = ang_coef
         self.LIN_VEL_COEF = lin_vel_coef
         self.ANG_VEL_COEF = ang_vel_coef
+        self.preallocate = preallocate
+        self.copy_obs = copy_obs
+        self._buffers = {}
 
     def reset(self, initial_state: GameState):
         pass
@@ -87,6 +96,10 @@ class DefaultObs(ObsBuilder):
     def build_obs(
         self, player: PlayerData, state: GameState, previous_action: np.ndarray
     ) -> Any:
+        if self.preallocate:
+            obs = self._build_obs_in_place(player, state, previous_action)
+            return obs.copy() if self.copy_obs else obs
+
         if player.team_num == common_values.ORANGE_TEAM:
             inverted = True
             ball = state.inverted_ball
@@ -124,6 +137,80 @@ class DefaultObs(ObsBuilder):
         obs.extend(enemies)
         return np.concatenate(obs)
 
+    def get_layout(self, n_pads: int, n_allies: int, n_enemies: int) -> ObsLayout:
+        """
+        Function that returns the named slices of the preallocated buffer for a player with the given team sizes.
+        """
+        return self._get_buffer(n_pads, n_allies, n_enemies)[0]
+
+    def _get_buffer(self, n_pads: int, n_allies: int, n_enemies: int):
+        key = (n_pads, n_allies, n_enemies)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            layout = ObsLayout(n_pads, n_allies, n_enemies)
+            buffer = self._buffers[key] = (layout, np.zeros(layout.size))
+        return buffer
+
+    def _build_obs_in_place(
+        self, player: PlayerData, state: GameState, previous_action: np.ndarray
+    ) -> np.ndarray:
+        inverted = player.team_num == common_values.ORANGE_TEAM
+        if inverted:
+            ball = state.inverted_ball
+            pads = state.inverted_boost_pads
+        else:
+            ball = state.ball
+            pads = state.boost_pads
+
+        allies = []
+        enemies = []
+        for other in state.players:
+            if other.car_id == player.car_id:
+                continue
+            if other.team_num == player.team_num:
+                allies.append(other)
+            else:
+                enemies.append(other)
+
+        layout, obs = self._get_buffer(len(pads), len(allies), len(enemies))
+
+        start = layout.ball.start
+        np.multiply(ball.position, self.POS_COEF, out=obs[start:start + 3])
+        np.multiply(ball.linear_velocity, self.LIN_VEL_COEF, out=obs[start + 3:start + 6])
+        np.multiply(ball.angular_velocity, self.ANG_VEL_COEF, out=obs[start + 6:start + 9])
+        obs[layout.previous_action] = previous_action
+        obs[layout.pads] = pads
+
+        self._write_player(obs, layout.player.start, player, inverted)
+        for i, other in enumerate(allies):
+            self._write_player(obs, layout.allies.start + i * CAR_OBS_LENGTH, other, inverted)
+        for i, other in enumerate(enemies):
+            self._write_player(obs, layout.enemies.start + i * CAR_OBS_LENGTH, other, inverted)
+
+        return obs
+
+    def _write_player(self, obs: np.ndarray, start: int, player: PlayerData, inverted: bool):
+        if inverted:
+            player_car = player.inverted_car_data
+        else:
+            player_car = player.car_data
+
+        np.multiply(player_car.position, self.POS_COEF, out=obs[start:start + 3])
+        obs[start + 3:start + 6] = player_car.forward()
+        obs[start + 6:start + 9] = player_car.up()
+        np.multiply(player_car.linear_velocity, self.LIN_VEL_COEF, out=obs[start + 9:start + 12])
+        np.multiply(player_car.angular_velocity, self.ANG_VEL_COEF, out=obs[start + 12:start + 15])
+        obs[start + 15] = player.boost_amount
+        obs[start + 16] = player.on_ground
+        obs[start + 17] = player.has_flip
+        obs[start + 18] = player.is_demoed
+
+    def _car_axes(self, state: GameState, inverted: bool):
+        if inverted:
+            return None # The inverted rotation matrices are derived with the same sign flip, see physics_object.py
+        rotations = state.rotation_matrices()
+        return rotations[:, :, 0], rotations[:, :, 2]
+
     def _add_player_to_obs(self, obs: List, player: PlayerData, inverted: bool):
         if inverted:
             player_car = player.inverted_car_data
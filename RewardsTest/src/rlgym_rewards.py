@@ -137,8 +137,9 @@ class EventReward(RewardFunction):
 
 
 class VelocityPlayerToBallReward(RewardFunction):
-    def __init__(self):
+    def __init__(self, use_scalar_projection=False):
         super().__init__()
+        self.use_scalar_projection = use_scalar_projection
 
     def reset(self, initial_state: GameState):
         pass
@@ -148,9 +149,19 @@ class VelocityPlayerToBallReward(RewardFunction):
     ) -> float:
         vel = player.car_data.linear_velocity
         pos_diff = state.ball.position - player.car_data.position
-        norm_pos_diff = pos_diff / np.linalg.norm(pos_diff)
-        norm_vel = vel / CAR_MAX_SPEED
-        return float(np.dot(norm_pos_diff, norm_vel))
+        if self.use_scalar_projection:
+            # Vector version of v=d/t <=> t=d/v <=> 1/t=v/d
+            # Max value should be max_speed / ball_radius = 2300 / 92.75 = 24.8
+            # Used to guide the agent towards the ball
+            norm = np.linalg.norm(pos_diff)
+            if norm == 0:
+                return 0
+            return float(np.dot(vel, pos_diff) / norm)
+        else:
+            # Regular component velocity
+            norm_pos_diff = pos_diff / np.linalg.norm(pos_diff)
+            norm_vel = vel / CAR_MAX_SPEED
+            return float(np.dot(norm_pos_diff, norm_vel))
 
 class FaceBallReward(RewardFunction):
     def reset(self, initial_state: GameState):
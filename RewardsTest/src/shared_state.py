@@ -0,0 +1,301 @@
+"""
+Shared-memory transport of the decoded GameState between the bot and a separate policy process.
+
+The bot writes the preallocated arrays of its GameState into a fixed-layout block guarded by a sequence counter (a
+seqlock: odd while a write is in progress), the policy process copies them into its own GameState, builds the
+observation, runs the policy and writes the action back with its own counter. The bot then only decodes packets,
+and the policy process can be pinned to dedicated cores:
+
+    python shared_state.py --name softkick_0 --index 0 --cpus 2 3
+
+MyBot starts that process itself when `policy_process` is set.
+"""
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+from rlbot.utils.structures.game_data_struct import FieldInfoPacket
+
+from rlgym_compat import GameState
+from rlgym_compat.game_state import MAX_CARS
+from rlgym_compat.physics_object import PHYSICS_LENGTH
+from rlgym_compat.player_data import PLAYER_LENGTH
+
+OBS_SIZE = 89
+CHECKPOINT_FOLDER = str(pathlib.Path(__file__).parent.resolve() / "checkpoint")
+
+# Header, int64 slots
+SEQUENCE = 0 # Even once a state is complete, odd while the bot writes it
+TICK = 1
+NUM_CARS = 2
+BLUE_SCORE = 3
+ORANGE_SCORE = 4
+LAST_TOUCH = 5
+EPISODE = 6 # Kickoffs started by the bot, the policy process resets its obs builder when it changes
+PLAYER_INDEX = 7
+NUM_BOOSTS = 8
+ACTION_SEQUENCE = 9 # Bumped by the policy process once an action is complete
+ACTION_TICK = 10 # Tick of the state the action was computed from
+CLOSED = 11
+HEADER_LENGTH = 16
+
+
+def block_layout(num_boosts: int) -> tuple:
+    """
+    Function that returns a dict with the (dtype, shape, offset) of every array of a shared block, and the total size
+    of the block. Every array starts on an 8-byte boundary.
+    """
+    arrays = [
+        ("header", np.int64, (HEADER_LENGTH,)),
+        ("action", np.int64, (8,)),
+        ("prev_action", np.float32, (8,)),
+        ("ball_physics", np.float32, (PHYSICS_LENGTH,)),
+        ("inverted_ball_physics", np.float32, (PHYSICS_LENGTH,)),
+        ("car_physics", np.float32, (MAX_CARS, PHYSICS_LENGTH)),
+        ("inverted_car_physics", np.float32, (MAX_CARS, PHYSICS_LENGTH)),
+        ("player_info", np.float32, (MAX_CARS, PLAYER_LENGTH)),
+        ("boost_pads", np.float32, (num_boosts,)),
+        ("inverted_boost_pads", np.float32, (num_boosts,)),
+    ]
+    layout = {}
+    offset = 0
+    for name, dtype, shape in arrays:
+        layout[name] = (dtype, shape, offset)
+        offset += np.dtype(dtype).itemsize * int(np.prod(shape))
+        offset += -offset % 8
+    return layout, offset
+
+
+# Arrays of the preallocated GameState copied through the block, row by row for the per-car ones. The rotation
+# matrices are left out, the policy process computes the ones it needs from the copied rows
+_CAR_ARRAYS = ("car_physics", "inverted_car_physics", "player_info")
+_STATE_ARRAYS = ("ball_physics", "inverted_ball_physics", "boost_pads", "inverted_boost_pads")
+
+
+class SharedBlock(object):
+    """
+    Numpy views over a shared memory block laid out by block_layout.
+    """
+
+    def __init__(self, name: str, num_boosts: int = None):
+        """
+        :param name: Name of the block.
+        :param num_boosts: Number of boost pads, to create the block. None attaches to an existing block.
+        """
+        if num_boosts is None:
+            self.memory = shared_memory.SharedMemory(name=name)
+            # Only the creator may unlink the block, the resource tracker of this process would do it on exit
+            try:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.memory._name, "shared_memory")
+            except (ImportError, AttributeError, KeyError):
+                pass
+            num_boosts = int(np.ndarray((HEADER_LENGTH,), np.int64, self.memory.buf)[NUM_BOOSTS])
+            self.owner = False
+        else:
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=block_layout(num_boosts)[1])
+            self.owner = True
+
+        self.name = name
+        for array_name, (dtype, shape, offset) in block_layout(num_boosts)[0].items():
+            setattr(self, array_name, np.ndarray(shape, dtype, self.memory.buf, offset))
+        if self.owner:
+            self.header[:] = 0
+            self.header[NUM_BOOSTS] = num_boosts
+            self.header[LAST_TOUCH] = -1
+
+    def close(self):
+        # The views must be released before the memory can be closed
+        for array_name in ("header", "action", "prev_action") + _STATE_ARRAYS + _CAR_ARRAYS:
+            setattr(self, array_name, None)
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class SharedMemoryPolicy(object):
+    """
+    Bot side of the transport, with the interface of policy_runtime.AsyncPolicy: `submit` publishes a state and
+    returns at once, `poll` returns the action of the policy process once it is ready.
+    """
+
+    def __init__(self, name: str, num_boosts: int, player_index: int, start_process: bool = True,
+                 process_args: list = None):
+        """
+        :param name: Name of the shared memory block, unique per bot.
+        :param num_boosts: Number of boost pads of the field.
+        :param player_index: Index of the player the policy plays.
+        :param start_process: Start the policy process of this module, stopped by close().
+        :param process_args: Extra command line arguments of the policy process (--cpus, --device...).
+        """
+        self.block = SharedBlock(name, num_boosts)
+        self.block.header[PLAYER_INDEX] = player_index
+        self.last_action_sequence = 0
+        self.episode = 0
+        self.process = None
+        if start_process:
+            command = [sys.executable, str(pathlib.Path(__file__).resolve()), "--name", name, "--index", str(player_index)]
+            self.process = subprocess.Popen(command + list(process_args or []))
+
+    def reset(self):
+        """
+        Function to call on every kickoff, the policy process resets its obs builder before the next state.
+        """
+        self.episode += 1 # Published with the next state, never alone
+
+    def submit(self, game_state: GameState, tick: int, prev_action: np.ndarray):
+        """
+        :param game_state: Preallocated GameState of the bot.
+        :param tick: Tick of the state, returned with its action.
+        :param prev_action: Controls of the previous action, used by the observation.
+        """
+        block = self.block
+        header = block.header
+        num_cars = len(game_state.players)
+
+        header[SEQUENCE] += 1 # Odd, readers retry until the write is complete
+        header[TICK] = tick
+        header[NUM_CARS] = num_cars
+        header[BLUE_SCORE] = game_state.blue_score
+        header[ORANGE_SCORE] = game_state.orange_score
+        header[LAST_TOUCH] = game_state.last_touch
+        header[EPISODE] = self.episode
+        block.prev_action[:] = prev_action
+        for name in _STATE_ARRAYS:
+            getattr(block, name)[:] = getattr(game_state, name)
+        for name in _CAR_ARRAYS:
+            getattr(block, name)[:num_cars] = getattr(game_state, name)[:num_cars]
+        header[SEQUENCE] += 1
+
+    def poll(self):
+        """
+        :return: A tuple with the bins of every head as a numpy array and the tick of its state, or None if the
+        policy process did not complete a new action.
+        """
+        header = self.block.header
+        sequence = int(header[ACTION_SEQUENCE])
+        if sequence == self.last_action_sequence or sequence % 2 == 1:
+            return None
+        action = self.block.action.copy()
+        tick = int(header[ACTION_TICK])
+        if int(header[ACTION_SEQUENCE]) != sequence:
+            return None # Overwritten meanwhile, the next poll gets the newer action
+        self.last_action_sequence = sequence
+        return action, tick
+
+    def close(self):
+        self.block.header[CLOSED] = 1
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.block.close()
+
+
+def read_state(block: SharedBlock, game_state: GameState, last_sequence: int, prev_action: np.ndarray = None):
+    """
+    Function that copies the latest complete state of a block into a preallocated GameState, and its previous action
+    into `prev_action` if given, retrying while the bot is writing it.
+
+    :return: A tuple with the sequence number, the tick and the episode of the copied state, or None if there is no
+    state newer than `last_sequence`.
+    """
+    header = block.header
+    while True:
+        sequence = int(header[SEQUENCE])
+        if sequence == last_sequence:
+            return None
+        if sequence % 2 == 1:
+            continue
+
+        num_cars = int(header[NUM_CARS])
+        game_state.blue_score = int(header[BLUE_SCORE])
+        game_state.orange_score = int(header[ORANGE_SCORE])
+        game_state.last_touch = int(header[LAST_TOUCH])
+        tick = int(header[TICK])
+        episode = int(header[EPISODE])
+        if prev_action is not None:
+            prev_action[:] = block.prev_action
+        for name in _STATE_ARRAYS:
+            getattr(game_state, name)[:] = getattr(block, name)
+        for name in _CAR_ARRAYS:
+            getattr(game_state, name)[:num_cars] = getattr(block, name)[:num_cars]
+
+        if int(header[SEQUENCE]) == sequence:
+            # Same player views as a decode, their matrices are recomputed from the rows just copied when needed
+            game_state._refresh_views(num_cars)
+            game_state.ball.invalidate()
+            game_state.inverted_ball.invalidate()
+            return sequence, tick, episode
+
+
+def serve(name: str, player_index: int, policy, obs_size: int = OBS_SIZE, poll_interval: float = 0.0001):
+    """
+    Policy process loop: waits for the states of the bot, builds the observation of `player_index` and writes back
+    the action of `policy` until the bot closes the block.
+    """
+    from rlgym_obs_builder import DefaultObs
+
+    block = SharedBlock(name)
+    field_info = FieldInfoPacket()
+    field_info.num_boosts = int(block.header[NUM_BOOSTS])
+    game_state = GameState(field_info, preallocate=True)
+    obs_builder = DefaultObs(preallocate=True)
+    prev_action = np.zeros(8)
+    episode = None
+    sequence = 0
+    try:
+        while not block.header[CLOSED]:
+            result = read_state(block, game_state, sequence, prev_action)
+            if result is None:
+                time.sleep(poll_interval)
+                continue
+            sequence, tick, state_episode = result
+            if state_episode != episode:
+                episode = state_episode
+                obs_builder.reset(game_state)
+
+            player = game_state.players[player_index]
+            obs = obs_builder.build_obs(player, game_state, prev_action)
+            action, _ = policy.get_action(obs)
+
+            block.header[ACTION_SEQUENCE] += 1
+            block.action[:] = action.cpu().numpy()
+            block.header[ACTION_TICK] = tick
+            block.header[ACTION_SEQUENCE] += 1
+    finally:
+        block.close()
+
+
+def main():
+    from policy_runtime import load_policy
+
+    parser = argparse.ArgumentParser(description="Policy process of a SoftKick bot, reading its states from shared memory.")
+    parser.add_argument("--name", required=True, help="Name of the shared memory block created by the bot")
+    parser.add_argument("--index", type=int, required=True, help="Index of the player of the bot")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FOLDER, help="Folder holding PPO_POLICY.pt")
+    parser.add_argument("--obs-size", type=int, default=OBS_SIZE)
+    parser.add_argument("--device", default=None, help="cuda or cpu, CUDA when available by default")
+    parser.add_argument("--variant", default=None, help="int8 or bf16 to run a quantized export")
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads used for CPU inference")
+    parser.add_argument("--cpus", type=int, nargs="*", default=None, help="Pin this process to these cores")
+    parser.add_argument("--poll-interval", type=float, default=0.0001, help="Seconds slept while no new state is ready")
+    args = parser.parse_args()
+
+    if args.cpus:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, args.cpus)
+        else:
+            print("Core pinning is not supported on this platform")
+    policy = load_policy(args.checkpoint, args.obs_size, args.device, args.threads, args.variant)
+    serve(args.name, args.index, policy, args.obs_size, args.poll_interval)
+
+
+if __name__ == "__main__":
+    main()
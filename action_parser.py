@@ -0,0 +1,14 @@
+import pathlib
+import sys
+
+from rlgym.utils.action_parsers import ActionParser
+
+# The control tables are shared with the action parser of the bot
+sys.path.append(str(pathlib.Path(__file__).parent.resolve() / "RewardsTest" / "src"))
+
+from action_table import LookupTable, curated_actions, make_control_table
+
+class LookupTableAction(LookupTable, ActionParser):
+    """
+    DiscreteAction backed by a precomputed control table, see RewardsTest/src/action_table.py.
+    """
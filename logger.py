@@ -3,61 +3,241 @@ import numpy as np
 from rlgym_ppo.util import MetricsLogger
 from rlgym_sim.utils.gamestates import GameState
 
-class Logger(MetricsLogger):
+from profiler import SUMMARY_LENGTH as PROFILE_SUMMARY_LENGTH, pull_profile, summarize_profile
+from reward import RewardTelemetry, pull_reward_telemetry
+
+class MetricsAggregator(object):
+    """
+    Fixed-size running statistics of the per-step metrics of a worker, pulled by the metrics logger every few steps
+    instead of shipping every step: Welford mean and variance, extrema and a fixed-bin histogram, used as a percentile
+    sketch, of the mean metrics, and sums of the rate metrics.
+
+    The histograms grow with the values instead of clipping them: a value at or above the upper bound of its
+    histogram doubles the bound, as many times as needed, folding every pair of bins into one.
+    """
+    MEAN_METRICS = ("ball_speed", "ball_height", "car_speed", "car_height", "boost_held")
+    RATE_METRICS = ("on_ground", "touch_rate", "demoed_rate")
+    N_METRICS = len(MEAN_METRICS) + len(RATE_METRICS)
+
+    # The histogram of every mean metric splits [0, upper bound) into SKETCH_BINS bins, a power of 2 so bins fold in
+    # pairs. The bounds start at the usual scale of every metric and double whenever a value reaches them
+    SKETCH_BINS = 32
+    SKETCH_UPPER_BOUNDS = np.array([6000.0, 2100.0, 2300.0, 2100.0, 1.0])
+
+    # Count, then mean, M2, min and max of every mean metric, the histogram upper bounds, the histograms and the sums
+    # of the rate metrics
+    SUMMARY_LENGTH = 1 + 5 * len(MEAN_METRICS) + SKETCH_BINS * len(MEAN_METRICS) + len(RATE_METRICS)
+
     def __init__(self):
+        n_mean = len(self.MEAN_METRICS)
+        self.summary = np.zeros(self.SUMMARY_LENGTH)
+        self.count = self.summary[0:1]
+        self.mean = self.summary[1:1 + n_mean]
+        self.m2 = self.summary[1 + n_mean:1 + 2 * n_mean]
+        self.minimum = self.summary[1 + 2 * n_mean:1 + 3 * n_mean]
+        self.maximum = self.summary[1 + 3 * n_mean:1 + 4 * n_mean]
+        self.upper_bounds = self.summary[1 + 4 * n_mean:1 + 5 * n_mean]
+        self.histograms = self.summary[1 + 5 * n_mean:-len(self.RATE_METRICS)].reshape(n_mean, self.SKETCH_BINS)
+        self.rate_sums = self.summary[-len(self.RATE_METRICS):]
+        self.upper_bounds[:] = self.SKETCH_UPPER_BOUNDS
+        self._bin_scale = self.SKETCH_BINS / self.upper_bounds
+        self._rows = np.arange(n_mean)
+        self.reset()
+
+    def reset(self):
+        # The upper bounds are kept, a metric that outgrew them would only grow them again
+        bounds = self.upper_bounds.copy()
+        self.summary[:] = 0
+        self.minimum[:] = np.inf
+        self.maximum[:] = -np.inf
+        self.upper_bounds[:] = bounds
+
+    def _fold(self, row: int, times: int):
+        """
+        Doubles the upper bound of the histogram of metric `row` `times` times, merging its bins pair by pair.
+        """
+        histogram = self.histograms[row]
+        half = self.SKETCH_BINS // 2
+        for _ in range(times):
+            histogram[:half] = histogram[0::2] + histogram[1::2]
+            histogram[half:] = 0
+        self.upper_bounds[row] *= 2.0**times
+        self._bin_scale[row] = self.SKETCH_BINS / self.upper_bounds[row]
+
+    def _grow(self, values: np.ndarray):
+        for row in np.flatnonzero(values >= self.upper_bounds):
+            if np.isfinite(values[row]):
+                times = 0
+                while values[row] >= self.upper_bounds[row] * 2.0**times:
+                    times += 1
+                self._fold(row, times)
+
+    def update(self, metrics: np.ndarray):
+        """
+        :param metrics: The N_METRICS values of a step, mean metrics first.
+        """
+        values = metrics[:len(self.MEAN_METRICS)]
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+        np.minimum(self.minimum, values, out=self.minimum)
+        np.maximum(self.maximum, values, out=self.maximum)
+        if (values >= self.upper_bounds).any():
+            self._grow(values)
+        bins = np.clip((values * self._bin_scale).astype(np.int64), 0, self.SKETCH_BINS - 1)
+        self.histograms[self._rows, bins] += 1
+        self.rate_sums += metrics[len(self.MEAN_METRICS):]
+
+    def pull(self) -> np.ndarray:
+        """
+        Returns the statistics flattened to SUMMARY_LENGTH values and resets them.
+        """
+        summary = self.summary.copy()
+        self.reset()
+        return summary
+
+    @classmethod
+    def merge(cls, summaries: list) -> dict:
+        """
+        Merges the summaries pulled from every worker, combining the Welford statistics pairwise, into the report of
+        every metric. Histograms are folded to the largest upper bound of their metric before they are summed.
+        Percentiles are the upper bounds of the histogram bins they fall in.
+        """
+        merged = cls()
+        for summary in summaries:
+            other = cls()
+            other.summary[:] = summary
+            other._bin_scale[:] = cls.SKETCH_BINS / other.upper_bounds
+            # Both bounds are initial bounds doubled a number of times, so their ratio is a power of 2
+            folds = np.rint(np.log2(other.upper_bounds / merged.upper_bounds)).astype(np.int64)
+            for row in np.flatnonzero(folds > 0):
+                merged._fold(row, folds[row])
+            for row in np.flatnonzero(folds < 0):
+                other._fold(row, -folds[row])
+            n = merged.count[0]
+            n_other = other.count[0]
+            if n_other == 0:
+                continue
+            total = n + n_other
+            delta = other.mean - merged.mean
+            merged.mean += delta * n_other / total
+            merged.m2 += other.m2 + delta**2 * n * n_other / total
+            merged.count[0] = total
+            np.minimum(merged.minimum, other.minimum, out=merged.minimum)
+            np.maximum(merged.maximum, other.maximum, out=merged.maximum)
+            merged.histograms += other.histograms
+            merged.rate_sums += other.rate_sums
+
+        report = {}
+        n = max(merged.count[0], 1)
+        bin_bounds = (np.arange(cls.SKETCH_BINS) + 1) / merged._bin_scale[:, None]
+        cumulative = np.cumsum(merged.histograms, axis=1) / n
+        for i, name in enumerate(cls.MEAN_METRICS):
+            report[name] = merged.mean[i]
+            report[f"{name}_std"] = np.sqrt(merged.m2[i] / n)
+            for percentile in (50, 90, 99):
+                bin_index = min(np.searchsorted(cumulative[i], percentile / 100), cls.SKETCH_BINS - 1)
+                report[f"{name}_p{percentile}"] = bin_bounds[i, bin_index]
+        for i, name in enumerate(cls.RATE_METRICS):
+            report[name] = merged.rate_sums[i]
+        return report
+
+class Logger(MetricsLogger):
+    def __init__(self, reward_telemetry=False, profile=False, flush_every=128):
+        """
+        :param reward_telemetry: Pull the per-component counters of CustomReward(telemetry=True) from the workers and
+        report them every iteration.
+        :param profile: Pull the stage timings of the environments built with makeEnvironment(profile=True) from the
+        workers and report them every iteration.
+        :param flush_every: Steps aggregated by a worker before its statistics are shipped to the learner, the steps
+        in between ship an empty array.
+        """
         self.blue_score = 0
         self.orange_score = 0
         self.logger_steps = 0
-        
-    def _collect_metrics(self, game_state: GameState) -> list:
-        ball_stats = np.array([
-            # Ball speed
-            np.linalg.norm(game_state.ball.linear_velocity),
-            # Ball height
-            game_state.ball.position[2]
-        ])
-        
-        p_stats = np.zeros(6)
+        self.reward_telemetry = reward_telemetry
+        self.profile = profile
+        self.flush_every = flush_every
+        # Per worker: every worker receives its own copy of the logger
+        self.aggregator = MetricsAggregator()
+        self.step_metrics = np.zeros(MetricsAggregator.N_METRICS)
+        self.pending_steps = 0
+
+    def _collect_metrics(self, game_state: GameState) -> np.ndarray:
+        metrics = self.step_metrics
+        # Ball speed and height
+        metrics[0] = np.linalg.norm(game_state.ball.linear_velocity)
+        metrics[1] = game_state.ball.position[2]
+
+        # Car speed and height, boost held, on ground, ball touch and is demoed, averaged over the players
+        car_speed = car_height = boost = on_ground = touch = demoed = 0.0
         for p in game_state.players:
-            p_stats += np.array([
-                # Car speed
-                np.linalg.norm(p.car_data.linear_velocity),
-                # Car height
-                p.car_data.position[2],
-                # Boost held
-                float(p.boost_amount),
-                # On ground
-                float(p.on_ground),
-                # Ball touch
-                float(p.ball_touched),
-                # Is demoed
-                float(p.is_demoed),
-            ])
-        p_stats /= len(game_state.players)
-
-        return np.concatenate([ball_stats, p_stats])
+            car_speed += np.linalg.norm(p.car_data.linear_velocity)
+            car_height += p.car_data.position[2]
+            boost += p.boost_amount
+            on_ground += p.on_ground
+            touch += p.ball_touched
+            demoed += p.is_demoed
+        metrics[2:] = car_speed, car_height, boost, on_ground, touch, demoed
+        metrics[2:] /= len(game_state.players)
+
+        self.aggregator.update(metrics)
+        self.pending_steps += 1
+        if self.pending_steps < self.flush_every:
+            return np.zeros(0)
+        self.pending_steps = 0
+
+        summaries = [self.aggregator.pull()]
+        if self.reward_telemetry:
+            # Counters accumulated by the reward function of this worker since the previous flush
+            summaries.append(pull_reward_telemetry())
+        if self.profile:
+            # Stage timings of this worker since the previous flush
+            summaries.append(pull_profile())
+
+        return np.concatenate(summaries)
 
     def _report_metrics(self, collected_metrics, wandb_run, cumulative_timesteps):
+        # Only the flush steps carry a summary, they are merged one by one instead of stacking every step
+        summaries = [summary for summary in (np.ravel(metrics) for metrics in collected_metrics) if summary.size > 0]
+        if not summaries:
+            # The steps of this window are reported with the next summaries, their rate sums arrive with them
+            wandb_run.log({"Cumulative Timesteps": cumulative_timesteps})
+            return
+
         step_diff = cumulative_timesteps - self.logger_steps
         self.logger_steps = cumulative_timesteps
 
-        metrics = np.array(collected_metrics)
-
-        mean_metrics = metrics[:, :5, :].mean(axis=0).mean(axis=1)
-        rate_metrics = metrics[:, 5:, :].sum(axis=0).sum(axis=1) / step_diff
-
-        report = { # Mean metrics
-                  "ball_speed": mean_metrics[0],
-                  "ball_height": mean_metrics[1],
-                  "car_speed": mean_metrics[2],
-                  "car_height": mean_metrics[3],
-                  "boost_held": mean_metrics[4],
-                   
-                   # Rate metrics
-                  "on_ground": rate_metrics[0],
-                  "touch_rate": rate_metrics[1],
-                  "demoed_rate": rate_metrics[2],
-
-                  "Cumulative Timesteps":cumulative_timesteps
-                }
+        report = MetricsAggregator.merge([summary[:MetricsAggregator.SUMMARY_LENGTH] for summary in summaries])
+        for name in MetricsAggregator.RATE_METRICS:
+            report[name] /= step_diff
+        report["Cumulative Timesteps"] = cumulative_timesteps
+
+        start = MetricsAggregator.SUMMARY_LENGTH
+        if self.reward_telemetry:
+            end = start + RewardTelemetry.SUMMARY_LENGTH
+            telemetry = np.stack([summary[start:end] for summary in summaries])
+            report.update(self._report_reward_telemetry(telemetry[:, :, None]))
+            start = end
+        if self.profile:
+            profile = np.stack([summary[start:start + PROFILE_SUMMARY_LENGTH] for summary in summaries])
+            report.update(summarize_profile(profile))
+
         wandb_run.log(report)
+
+    def _report_reward_telemetry(self, telemetry: np.ndarray) -> dict:
+        # (steps, stats * names, ...) -> (stats, names), summing the counters and keeping the maxima
+        telemetry = telemetry.reshape(len(telemetry), len(RewardTelemetry.STATS), len(RewardTelemetry.NAMES), -1)
+        raw_sum, weighted_sum, count = telemetry[:, :3].sum(axis=(0, 3))
+        maximum = telemetry[:, 3].max(axis=(0, 2))
+
+        safe_count = np.maximum(count, 1)
+        report = {}
+        for i, name in enumerate(RewardTelemetry.NAMES):
+            report[f"reward/{name}_raw_mean"] = raw_sum[i] / safe_count[i]
+            report[f"reward/{name}_weighted_mean"] = weighted_sum[i] / safe_count[i]
+            report[f"reward/{name}_weighted_sum"] = weighted_sum[i]
+            report[f"reward/{name}_max"] = maximum[i] if count[i] > 0 else 0.0
+            report[f"reward/{name}_count"] = count[i]
+        return report
@@ -0,0 +1,63 @@
+import pathlib
+import sys
+from typing import Any
+
+import numpy as np
+
+from rlgym.utils import common_values
+from rlgym.utils.obs_builders import DefaultObs
+from rlgym_sim.utils.gamestates import GameState, PlayerData
+
+# The vectorized observations are shared with the observation builder of the bot
+sys.path.append(str(pathlib.Path(__file__).parent.resolve() / "RewardsTest" / "src"))
+
+from batch_obs import BatchObs, ObsLayout, BALL_OBS_LENGTH
+
+class BatchDefaultObs(BatchObs, DefaultObs):
+    """
+    DefaultObs that builds the observations of every player once per step in pre_step, build_obs then only fills in
+    the previous action of the player and returns its row. Rows are float32 and bit-identical to DefaultObs.build_obs.
+    """
+
+    def __init__(self, *args, preallocate=False, copy_obs=False, **kwargs):
+        """
+        :param preallocate: Write every step into one of two buffers owned by the builder instead of a new matrix. The
+        rows returned by build_obs then stay valid until the pre_step after the next one, which covers the extra
+        observation built by an environment reset.
+        :param copy_obs: Return a copy of the row instead of a view into the buffer.
+        """
+        super().__init__(*args, **kwargs)
+        self.preallocate = preallocate
+        self.copy_obs = copy_obs
+        self._buffers = [None, None]
+        self._buffer_index = 0
+        self._obs = None
+        self._rows = {}
+
+    def pre_step(self, state: GameState):
+        out = None
+        if self.preallocate:
+            self._buffer_index ^= 1
+            out = self._buffers[self._buffer_index]
+
+        self._obs = self.build_obs_batch(state, None, out=out)
+        self._rows = {player.car_id: i for i, player in enumerate(state.players)}
+
+        if self.preallocate:
+            self._buffers[self._buffer_index] = self._obs
+
+    def build_obs(self, player: PlayerData, state: GameState, previous_action: np.ndarray) -> Any:
+        obs = self._obs[self._rows[player.car_id]]
+        obs[BALL_OBS_LENGTH:BALL_OBS_LENGTH + common_values.NUM_ACTIONS] = previous_action
+        return obs.copy() if self.copy_obs else obs
+
+    def get_layout(self, n_pads: int, n_allies: int, n_enemies: int) -> ObsLayout:
+        """
+        Function that returns the named slices of an observation row for a player with the given team sizes.
+        """
+        return ObsLayout(n_pads, n_allies, n_enemies)
+
+    def _car_axes(self, state: GameState, inverted: bool):
+        # Orientation is taken from the inverted cars, the simulator mirrors the quaternion on its own
+        cars = [p.inverted_car_data if inverted else p.car_data for p in state.players]
+        return np.stack([c.forward() for c in cars]), np.stack([c.up() for c in cars])
@@ -0,0 +1,155 @@
+from time import perf_counter_ns
+from typing import Any
+
+import numpy as np
+
+from rlgym.utils.action_parsers import ActionParser
+from rlgym.utils.obs_builders import ObsBuilder
+from rlgym.utils.reward_functions import RewardFunction
+from rlgym.utils.terminal_conditions import TerminalCondition
+from rlgym_sim.utils.gamestates import GameState, PlayerData
+
+# Timed stages of an environment step, in the order of the summaries shipped to the Logger
+STAGES = ("terminal", "reward_pre_step", "reward", "final_reward", "obs_pre_step", "obs", "action")
+
+# Log2 histogram of the call durations: bucket i holds the calls of [2^(i + MIN_BUCKET_LOG2), 2^(i + 1 + MIN_BUCKET_LOG2))
+# nanoseconds, the first and last buckets also hold everything below and above
+N_BUCKETS = 16
+MIN_BUCKET_LOG2 = 8 # 256 ns
+
+# Per stage: number of calls, total and maximum duration in nanoseconds, then the histogram
+STAGE_SUMMARY_LENGTH = 3 + N_BUCKETS
+SUMMARY_LENGTH = len(STAGES) * STAGE_SUMMARY_LENGTH
+
+class StageProfiler(object):
+    """
+    Accumulates the durations of every stage of this process until pulled by the metrics logger.
+    """
+
+    def __init__(self):
+        self.counters = np.zeros((len(STAGES), STAGE_SUMMARY_LENGTH))
+        self._stage_index = {stage: i for i, stage in enumerate(STAGES)}
+
+    def record(self, stage: str, duration_ns: int):
+        row = self.counters[self._stage_index[stage]]
+        row[0] += 1
+        row[1] += duration_ns
+        if duration_ns > row[2]:
+            row[2] = duration_ns
+        bucket = min(max(duration_ns.bit_length() - 1 - MIN_BUCKET_LOG2, 0), N_BUCKETS - 1)
+        row[3 + bucket] += 1
+
+    def pull(self) -> np.ndarray:
+        """
+        Returns the counters flattened to SUMMARY_LENGTH values, stage by stage, and resets them.
+        """
+        summary = self.counters.ravel().copy()
+        self.counters[:] = 0
+        return summary
+
+# Profiler shared by every wrapper of this process, i.e. the env of an rlgym_ppo worker
+_profiler = StageProfiler()
+
+def pull_profile() -> np.ndarray:
+    return _profiler.pull()
+
+def summarize_profile(summaries: np.ndarray) -> dict:
+    """
+    Merges the summaries pulled from every worker and step, of shape (..., SUMMARY_LENGTH), into the statistics of
+    every stage. Percentiles are the upper bounds of the histogram buckets they fall in.
+    """
+    counters = summaries.reshape(-1, len(STAGES), STAGE_SUMMARY_LENGTH)
+    calls = counters[:, :, 0].sum(axis=0)
+    total_ns = counters[:, :, 1].sum(axis=0)
+    max_ns = counters[:, :, 2].max(axis=0)
+    histograms = counters[:, :, 3:].sum(axis=0)
+    bucket_bounds_us = 2.0 ** (np.arange(N_BUCKETS) + 1 + MIN_BUCKET_LOG2) / 1000
+
+    all_stages_ns = max(total_ns.sum(), 1)
+    report = {}
+    for i, stage in enumerate(STAGES):
+        if calls[i] == 0:
+            continue
+        cumulative = np.cumsum(histograms[i]) / calls[i]
+        report[f"profile/{stage}_calls"] = calls[i]
+        report[f"profile/{stage}_mean_us"] = total_ns[i] / calls[i] / 1000
+        report[f"profile/{stage}_p50_us"] = bucket_bounds_us[np.searchsorted(cumulative, 0.5)]
+        report[f"profile/{stage}_p99_us"] = bucket_bounds_us[min(np.searchsorted(cumulative, 0.99), N_BUCKETS - 1)]
+        report[f"profile/{stage}_max_us"] = max_ns[i] / 1000
+        report[f"profile/{stage}_share"] = total_ns[i] / all_stages_ns
+    return report
+
+class ProfiledTerminalCondition(TerminalCondition):
+    def __init__(self, condition: TerminalCondition):
+        super().__init__()
+        self.condition = condition
+
+    def reset(self, initial_state: GameState):
+        self.condition.reset(initial_state)
+
+    def is_terminal(self, current_state: GameState) -> bool:
+        start = perf_counter_ns()
+        terminal = self.condition.is_terminal(current_state)
+        _profiler.record("terminal", perf_counter_ns() - start)
+        return terminal
+
+class ProfiledReward(RewardFunction):
+    def __init__(self, reward_fn: RewardFunction):
+        super().__init__()
+        self.reward_fn = reward_fn
+
+    def reset(self, initial_state: GameState):
+        self.reward_fn.reset(initial_state)
+
+    def pre_step(self, state: GameState):
+        start = perf_counter_ns()
+        self.reward_fn.pre_step(state)
+        _profiler.record("reward_pre_step", perf_counter_ns() - start)
+
+    def get_reward(self, player: PlayerData, state: GameState, previous_action: np.ndarray) -> float:
+        start = perf_counter_ns()
+        reward = self.reward_fn.get_reward(player, state, previous_action)
+        _profiler.record("reward", perf_counter_ns() - start)
+        return reward
+
+    def get_final_reward(self, player: PlayerData, state: GameState, previous_action: np.ndarray) -> float:
+        start = perf_counter_ns()
+        reward = self.reward_fn.get_final_reward(player, state, previous_action)
+        _profiler.record("final_reward", perf_counter_ns() - start)
+        return reward
+
+class ProfiledObsBuilder(ObsBuilder):
+    def __init__(self, obs_builder: ObsBuilder):
+        super().__init__()
+        self.obs_builder = obs_builder
+
+    def get_obs_space(self):
+        return self.obs_builder.get_obs_space()
+
+    def reset(self, initial_state: GameState):
+        self.obs_builder.reset(initial_state)
+
+    def pre_step(self, state: GameState):
+        start = perf_counter_ns()
+        self.obs_builder.pre_step(state)
+        _profiler.record("obs_pre_step", perf_counter_ns() - start)
+
+    def build_obs(self, player: PlayerData, state: GameState, previous_action: np.ndarray) -> Any:
+        start = perf_counter_ns()
+        obs = self.obs_builder.build_obs(player, state, previous_action)
+        _profiler.record("obs", perf_counter_ns() - start)
+        return obs
+
+class ProfiledActionParser(ActionParser):
+    def __init__(self, action_parser: ActionParser):
+        super().__init__()
+        self.action_parser = action_parser
+
+    def get_action_space(self):
+        return self.action_parser.get_action_space()
+
+    def parse_actions(self, actions: Any, state: GameState) -> np.ndarray:
+        start = perf_counter_ns()
+        parsed = self.action_parser.parse_actions(actions, state)
+        _profiler.record("action", perf_counter_ns() - start)
+        return parsed
@@ -0,0 +1,331 @@
+import itertools
+import json
+import os
+
+import numpy as np
+
+from rlgym_sim.utils.common_values import BLUE_TEAM, ORANGE_TEAM
+from rlgym_sim.utils.gamestates import GameState, PlayerData
+from rlgym_sim.utils.reward_functions import RewardFunction
+
+from reward import REWARD_COMPONENTS, CustomReward, reward_components
+
+MAGIC = b"SKREPLAY"
+HEADER_ALIGNMENT = 64
+DEFAULT_BUFFER_STEPS = 1024
+DEFAULT_CHUNK_STEPS = 65536
+
+# Order of the values of batch_rewards.event_values, weighted by the event weights of a reward configuration
+EVENT_FIELDS = ("match_goals", "team_score", "opponent_score", "ball_touched", "match_shots", "match_saves",
+                "match_demolishes", "boost_amount")
+
+# Numbers the recorders of a process, so two environments built by the same worker never share a store
+_recorder_ids = itertools.count()
+
+def trajectory_dtype(n_cars: int) -> np.dtype:
+    """
+    Function that returns the structured type of a trajectory step: the episode it belongs to, whether it is the
+    initial state of the episode, the scores, the ball physics and one row per car.
+    """
+    car = np.dtype([
+        ("car_id", np.int16),
+        ("team_num", np.int8),
+        ("position", np.float32, (3,)),
+        ("linear_velocity", np.float32, (3,)),
+        ("angular_velocity", np.float32, (3,)),
+        ("euler_angles", np.float32, (3,)),
+        ("boost_amount", np.float32),
+        ("ball_touched", np.bool_),
+        ("on_ground", np.bool_),
+        ("is_demoed", np.bool_),
+        ("match_goals", np.int16),
+        ("match_shots", np.int16),
+        ("match_saves", np.int16),
+        ("match_demolishes", np.int16),
+    ])
+    return np.dtype([
+        ("episode", np.int64),
+        ("reset", np.bool_),
+        ("blue_score", np.int16),
+        ("orange_score", np.int16),
+        ("ball_position", np.float32, (3,)),
+        ("ball_linear_velocity", np.float32, (3,)),
+        ("ball_angular_velocity", np.float32, (3,)),
+        ("cars", car, (n_cars,)),
+    ])
+
+def _encode_header(dtype: np.dtype, metadata: dict) -> bytes:
+    header = json.dumps({
+        "version": 1,
+        "descr": np.lib.format.dtype_to_descr(dtype),
+        "metadata": metadata,
+    }).encode()
+    # The steps start on an aligned offset, so the file can be memory mapped as is
+    length = len(MAGIC) + 4 + len(header)
+    header += b" " * (-length % HEADER_ALIGNMENT)
+    return MAGIC + len(header).to_bytes(4, "little") + header
+
+def read_header(file_path) -> tuple:
+    """
+    Function that reads the header of a trajectory store.
+
+    :return: A tuple with the step type, the metadata dict and the offset of the first step.
+    """
+    with open(file_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{file_path} is not a trajectory store")
+        length = int.from_bytes(f.read(4), "little")
+        header = json.loads(f.read(length))
+    return np.lib.format.descr_to_dtype(header["descr"]), header["metadata"], len(MAGIC) + 4 + length
+
+def read_trajectories(file_path) -> np.ndarray:
+    """
+    Function that memory maps the steps of a trajectory store. A step cut short by a crash is left out.
+
+    :return: A read-only structured array with the fields of trajectory_dtype.
+    """
+    dtype, _, offset = read_header(file_path)
+    n_steps = (os.path.getsize(file_path) - offset) // dtype.itemsize
+    if n_steps == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode="r", offset=offset, shape=(n_steps,))
+
+class TrajectoryWriter(object):
+    """
+    Appends game states to a trajectory store, buffered in a preallocated structured array. Works with the GameState
+    of rlgym_sim as well as with the one of rlgym_compat, which have the same fields.
+    """
+
+    def __init__(self, file_path, n_cars: int, buffer_steps: int = DEFAULT_BUFFER_STEPS, metadata: dict = None):
+        """
+        :param file_path: Store to append to. An existing store must have been written for the same number of cars.
+        :param n_cars: Number of cars of every state.
+        :param buffer_steps: Number of steps kept in memory before they are written.
+        :param metadata: JSON serializable dict stored in the header of a new store (gamma, tick skip...).
+        """
+        self.dtype = trajectory_dtype(n_cars)
+        self.file_path = file_path
+        self.buffer = np.zeros(buffer_steps, dtype=self.dtype)
+        self.pending = 0
+        self.episode = -1
+
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            dtype, _, offset = read_header(file_path)
+            if dtype != self.dtype:
+                raise ValueError(f"{file_path} holds steps of type {dtype}, not {self.dtype}")
+            size = os.path.getsize(file_path)
+            n_steps = (size - offset) // dtype.itemsize
+            if offset + n_steps * dtype.itemsize != size:
+                os.truncate(file_path, offset + n_steps * dtype.itemsize)
+            if n_steps > 0:
+                self.episode = int(read_trajectories(file_path)["episode"][-1])
+            self.fp = open(file_path, "ab")
+        else:
+            self.fp = open(file_path, "wb")
+            self.fp.write(_encode_header(self.dtype, metadata or {}))
+
+    def write(self, state: GameState, reset: bool = False):
+        """
+        :param state: State to append.
+        :param reset: True for the initial state of an episode, which starts a new episode.
+        """
+        if reset or self.episode < 0:
+            self.episode += 1
+        step = self.buffer[self.pending]
+        step["episode"] = self.episode
+        step["reset"] = reset
+        step["blue_score"] = state.blue_score
+        step["orange_score"] = state.orange_score
+        step["ball_position"] = state.ball.position
+        step["ball_linear_velocity"] = state.ball.linear_velocity
+        step["ball_angular_velocity"] = state.ball.angular_velocity
+
+        cars = step["cars"]
+        for car, player in zip(cars, state.players):
+            car["car_id"] = player.car_id
+            car["team_num"] = player.team_num
+            car["position"] = player.car_data.position
+            car["linear_velocity"] = player.car_data.linear_velocity
+            car["angular_velocity"] = player.car_data.angular_velocity
+            car["euler_angles"] = player.car_data.euler_angles()
+            car["boost_amount"] = player.boost_amount
+            car["ball_touched"] = player.ball_touched
+            car["on_ground"] = player.on_ground
+            car["is_demoed"] = player.is_demoed
+            car["match_goals"] = player.match_goals
+            car["match_shots"] = player.match_shots
+            car["match_saves"] = player.match_saves
+            car["match_demolishes"] = player.match_demolishes
+
+        self.pending += 1
+        if self.pending == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.pending == 0 or self.fp is None:
+            return
+        self.fp.write(self.buffer[:self.pending].tobytes())
+        self.fp.flush()
+        self.pending = 0
+
+    def close(self):
+        if self.fp is None:
+            return
+        self.flush()
+        self.fp.close()
+        self.fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class TrajectoryRecorder(RewardFunction):
+    """
+    Wraps the reward function of an environment and records every state it sees, i.e. the initial state of every
+    episode and the state of every step, in `<folder>/trajectories_<pid>_<n>.bin` so every recorder has its own store,
+    n numbering the recorders of a worker.
+    """
+
+    def __init__(self, reward_fn: RewardFunction, folder: str, n_cars: int, metadata: dict = None):
+        super().__init__()
+        self.reward_fn = reward_fn
+        self.folder = folder
+        self.n_cars = n_cars
+        self.metadata = metadata
+        self.writer = None
+
+    def _write(self, state: GameState, reset: bool):
+        if self.writer is None:
+            # Opened lazily, the wrapper is built before the environment is sent to its worker
+            os.makedirs(self.folder, exist_ok=True)
+            file_path = os.path.join(self.folder, f"trajectories_{os.getpid()}_{next(_recorder_ids)}.bin")
+            self.writer = TrajectoryWriter(file_path, self.n_cars, metadata=self.metadata)
+        self.writer.write(state, reset)
+
+    def reset(self, initial_state: GameState):
+        self._write(initial_state, reset=True)
+        self.reward_fn.reset(initial_state)
+
+    def pre_step(self, state: GameState):
+        self._write(state, reset=False)
+        self.reward_fn.pre_step(state)
+
+    def get_reward(self, player: PlayerData, state: GameState, previous_action: np.ndarray) -> float:
+        return self.reward_fn.get_reward(player, state, previous_action)
+
+    def get_final_reward(self, player: PlayerData, state: GameState, previous_action: np.ndarray) -> float:
+        return self.reward_fn.get_final_reward(player, state, previous_action)
+
+def reward_config(reward_fn: CustomReward = None, **overrides) -> dict:
+    """
+    Function that returns the configuration scored by score_trajectories: the rewardWeights, the finalUpperBound, the
+    event weights, the aerial weight and the velocity projection of `reward_fn` (a default CustomReward if None),
+    updated with `overrides`. A partial "weights" override only replaces the weights it names.
+    """
+    if reward_fn is None:
+        reward_fn = CustomReward()
+    config = {
+        "weights": dict(reward_fn.rewardWeights),
+        "final_upper_bound": reward_fn.finalUpperBound,
+        "event_weights": reward_fn.eventReward.weights.tolist(),
+        "aerial_weight": reward_fn.ballTouchedByPlayer.aerial_weight,
+        "use_scalar_projection": reward_fn.velocityPlayerToBallReward.use_scalar_projection,
+    }
+    overrides = dict(overrides)
+    config["weights"].update(overrides.pop("weights", {}))
+    config.update(overrides)
+    return config
+
+def _event_values(steps: np.ndarray) -> np.ndarray:
+    # Same values as batch_rewards.event_values for every step and car, shape (T, n_cars, len(EVENT_FIELDS))
+    cars = steps["cars"]
+    blue = cars["team_num"] == BLUE_TEAM
+    blue_score = steps["blue_score"][:, None]
+    orange_score = steps["orange_score"][:, None]
+    values = np.empty(cars.shape + (len(EVENT_FIELDS),))
+    values[..., 0] = cars["match_goals"]
+    values[..., 1] = np.where(blue, blue_score, orange_score)
+    values[..., 2] = np.where(blue, orange_score, blue_score)
+    values[..., 3] = cars["ball_touched"]
+    values[..., 4] = cars["match_shots"]
+    values[..., 5] = cars["match_saves"]
+    values[..., 6] = cars["match_demolishes"]
+    values[..., 7] = cars["boost_amount"]
+    return values
+
+def terminated_steps(trajectories: np.ndarray) -> int:
+    """
+    Function that returns the number of leading steps of a store that belong to terminated episodes. An episode only
+    shows it reached its terminal state through the initial state of the next one, so the steps from the last initial
+    state on belong to an episode the store was closed in the middle of.
+    """
+    resets = np.flatnonzero(trajectories["reset"])
+    return int(resets[-1]) if len(resets) > 0 else 0
+
+def score_trajectories(trajectories: np.ndarray, configs: list, chunk_steps: int = DEFAULT_CHUNK_STEPS) -> np.ndarray:
+    """
+    Re-scores recorded trajectories with several reward configurations in one pass over the store, as CustomReward
+    would have rewarded them: the weighted components on every step and the final bonus on the last step of every
+    episode. The components are computed once per chunk and shared by every configuration.
+
+    :param trajectories: Steps returned by read_trajectories.
+    :param configs: Configurations built with reward_config.
+    :param chunk_steps: Number of steps read and scored at once.
+
+    :return: An array of shape (len(configs), terminated_steps(trajectories), n_cars): the last episode of the store
+    has not reached its terminal state, so it gets no final bonus and is left out. The initial states of the episodes
+    are not rewarded and hold NaN, so the rewards of a car read like the episodes of a reward log.
+    """
+    trajectories = trajectories[:terminated_steps(trajectories)]
+    n_steps = len(trajectories)
+    n_cars = trajectories.dtype["cars"].shape[0]
+    weights = np.array([[config["weights"][name] for name in REWARD_COMPONENTS] for config in configs])
+    event_weights = np.array([config["event_weights"] for config in configs])
+    final_upper_bounds = np.array([config["final_upper_bound"] for config in configs])
+    # Components only depend on the sub-reward settings, they are computed once per distinct setting
+    settings = {(config["aerial_weight"], config["use_scalar_projection"]) for config in configs}
+    rewards = np.empty((len(configs), n_steps, n_cars))
+
+    # The last step of an episode is the one before the next initial state
+    episodes = trajectories["episode"]
+    final = np.ones(n_steps, dtype=bool)
+    final[:-1] = episodes[1:] != episodes[:-1]
+
+    previous_values = None
+    for start in range(0, n_steps, chunk_steps):
+        steps = np.asarray(trajectories[start:start + chunk_steps])
+        cars = steps["cars"]
+        reset = steps["reset"]
+
+        # Event values only count their increase since the previous step of the same episode
+        values = _event_values(steps)
+        previous = np.empty_like(values)
+        previous[1:] = values[:-1]
+        previous[0] = values[0] if previous_values is None else previous_values
+        previous[reset] = values[reset]
+        event_diffs = np.maximum(values - previous, 0)
+        previous_values = values[-1]
+
+        ball_position = steps["ball_position"].astype(np.float64)[:, None]
+        components = {}
+        for aerial_weight, use_scalar_projection in settings:
+            components[aerial_weight, use_scalar_projection] = reward_components(
+                ball_position, cars["position"].astype(np.float64), cars["linear_velocity"].astype(np.float64),
+                cars["ball_touched"], np.zeros(cars.shape), aerial_weight, use_scalar_projection
+            )
+
+        ball_y = ball_position[:, :, 1]
+        towards_opponent = (((cars["team_num"] == BLUE_TEAM) & (ball_y > 0))
+                            | ((cars["team_num"] == ORANGE_TEAM) & (ball_y < 0)))
+        bonus_sign = np.where(towards_opponent, 1.0, -1.0) * final[start:start + len(steps), None]
+
+        for i, config in enumerate(configs):
+            setting = (config["aerial_weight"], config["use_scalar_projection"])
+            chunk = components[setting][..., :3] @ weights[i, :3]
+            chunk += weights[i, 3] * (event_diffs @ event_weights[i])
+            chunk += bonus_sign * final_upper_bounds[i]
+            chunk[reset] = np.nan
+            rewards[i, start:start + len(steps)] = chunk
+    return rewards
@@ -0,0 +1,248 @@
+"""
+Sweep of the CustomReward weights and of the threshold added to its final reward over recorded kickoffs (see
+replay.py), scored in a process pool.
+
+    python sweep.py trajectories/*.bin --param ball_touched=2,4,8 --param threshold=0,0.25,0.5
+    python sweep.py trajectories/*.bin --param naive_speed=0:1 --param event=0:0.1 --samples 64
+
+`name=v1,v2,...` sweeps a grid of values, `name=low:high` draws `--samples` values uniformly, crossed with the grid.
+Every configuration reports the statistics of the mean discounted return of its episodes, as analyze_data.py
+computes them, and the correlation of that return with touching the ball and with winning the kickoff. Like
+analyze_data.py the final reward is left out of the returns, so sweeping `threshold` requires --with-final. Results
+are cached by a hash of the configuration and of the stores, so an extended sweep only scores the new configurations.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(str(pathlib.Path(__file__).parent.resolve() / "RewardsTest"))
+
+from analyze_data import discounted_returns, episode_windows
+from replay import read_trajectories, reward_config, score_trajectories, terminated_steps
+from reward import REWARD_COMPONENTS
+
+TICK_SKIP = 8
+HALF_LIFE_SECONDS = 5
+GAMMA = np.exp(np.log(0.5) / (120 / TICK_SKIP * HALF_LIFE_SECONDS))
+
+# finalUpperBound of CustomReward without its threshold_to_add
+FINAL_UPPER_BOUND_BASE = 0.3686379850539045
+PARAMETERS = REWARD_COMPONENTS + ("threshold",)
+DEFAULT_CACHE = "sweep_cache.jsonl"
+
+def parse_params(specs: list) -> tuple:
+    """
+    Parses the `name=v1,v2,...` and `name=low:high` specifications into a dict of grid values and a dict of ranges.
+    """
+    grid, ranges = {}, {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if name not in PARAMETERS:
+            raise ValueError(f"Unknown parameter '{name}', expected one of {', '.join(PARAMETERS)}")
+        if ":" in values:
+            low, high = values.split(":")
+            ranges[name] = (float(low), float(high))
+        else:
+            grid[name] = [float(value) for value in values.split(",")]
+    return grid, ranges
+
+def make_sweep(grid: dict, ranges: dict, samples: int, seed: int) -> list:
+    """
+    Returns the parameters of every configuration: the cartesian product of the grid, crossed with `samples` uniform
+    draws of the ranges if any.
+    """
+    names = list(grid)
+    points = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    if not ranges:
+        return points
+    rng = np.random.default_rng(seed)
+    sweep = []
+    for point in points:
+        for _ in range(samples):
+            sample = dict(point)
+            for name, (low, high) in ranges.items():
+                sample[name] = float(rng.uniform(low, high))
+            sweep.append(sample)
+    return sweep
+
+def to_reward_config(params: dict) -> dict:
+    weights = {name: params[name] for name in REWARD_COMPONENTS if name in params}
+    overrides = {"weights": weights}
+    if "threshold" in params:
+        overrides["final_upper_bound"] = FINAL_UPPER_BOUND_BASE + params["threshold"]
+    return reward_config(**overrides)
+
+def file_digest(file_path, chunk_size: int = 1 << 24) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def result_key(config: dict, data_digests: list, gamma: float, back: int, with_final: bool) -> str:
+    content = json.dumps({"config": config, "data": sorted(data_digests), "gamma": gamma, "back": back,
+                          "with_final": with_final}, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+def episode_outcomes(trajectories: np.ndarray) -> tuple:
+    """
+    Returns, for every car and episode of a store, whether the car touched the ball and whether the ball left the
+    kickoff towards the opponent side on the last step. Both are arrays of shape (n_cars, n_episodes). The last,
+    unterminated episode of the store is left out, as in score_trajectories.
+    """
+    trajectories = trajectories[:terminated_steps(trajectories)]
+    steps = trajectories[~trajectories["reset"]]
+    if len(steps) == 0:
+        n_cars = trajectories.dtype["cars"].shape[0]
+        return np.zeros((n_cars, 0), dtype=bool), np.zeros((n_cars, 0), dtype=bool)
+    episodes = steps["episode"]
+    begins = np.flatnonzero(np.concatenate(([True], episodes[1:] != episodes[:-1])))
+    finals = np.concatenate((begins[1:], [len(steps)])) - 1
+
+    cars = steps["cars"]
+    touched = np.add.reduceat(cars["ball_touched"].astype(np.int64), begins, axis=0) > 0
+    ball_y = steps["ball_position"][finals, 1][:, None]
+    teams = cars["team_num"][finals]
+    won = ((teams == 0) & (ball_y > 0)) | ((teams == 1) & (ball_y < 0))
+    return touched.T, won.T
+
+def evaluate_store(file_path, configs: list, gamma: float, back: int, with_final: bool = False) -> list:
+    """
+    Scores a store with every configuration at once and returns, per configuration, the mean discounted return of
+    every car and episode, flattened.
+    """
+    trajectories = read_trajectories(file_path)
+    n_steps = terminated_steps(trajectories)
+    if n_steps == 0:
+        return [np.empty(0) for _ in configs]
+    rewards = score_trajectories(trajectories, configs)
+    reset = np.asarray(trajectories["reset"][:n_steps])
+
+    # Rewards in the layout of a reward log: the initial states dropped, a NaN after the last step of every episode
+    episodes = trajectories["episode"][:n_steps][~reset]
+    done = np.flatnonzero(np.concatenate((episodes[1:] != episodes[:-1], [True])))
+    results = []
+    for config_rewards in rewards:
+        means = []
+        for series in config_rewards[~reset].T:
+            values = np.insert(series, done + 1, np.nan)
+            starts, stops, _ = episode_windows(values, back, with_final)
+            returns, mask = discounted_returns(values, starts, stops, gamma)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means.append(returns.sum(axis=1) / mask.sum(axis=1))
+        results.append(np.concatenate(means))
+    return results
+
+def _correlation(returns: np.ndarray, outcome: np.ndarray) -> float:
+    if len(returns) < 2 or returns.std() == 0 or outcome.std() == 0:
+        return float("nan")
+    return float(np.corrcoef(returns, outcome)[0, 1])
+
+def summarize(returns: np.ndarray, touched: np.ndarray, won: np.ndarray) -> dict:
+    valid = ~np.isnan(returns)
+    returns, touched, won = returns[valid], touched[valid].astype(np.float64), won[valid].astype(np.float64)
+    if len(returns) == 0:
+        return {"episodes": 0}
+    return {
+        "episodes": int(len(returns)),
+        "mean": float(returns.mean()),
+        "std": float(returns.std()),
+        "p50": float(np.percentile(returns, 50)),
+        "p95": float(np.percentile(returns, 95)),
+        "corr_touch": _correlation(returns, touched),
+        "corr_win": _correlation(returns, won),
+    }
+
+def load_cache(cache_path) -> dict:
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    cache[entry["key"]] = entry
+    return cache
+
+def run_sweep(files: list, sweep: list, gamma: float = GAMMA, back: int = 0, with_final: bool = False,
+              processes: int = None, batch_size: int = 8, cache_path=DEFAULT_CACHE) -> list:
+    """
+    Evaluates every configuration of `sweep` on the stores `files`, skipping the ones found in the cache, and returns
+    the result of every configuration, in order.
+    """
+    if not with_final and any("threshold" in params for params in sweep):
+        # The threshold only moves the final reward, which the returns leave out: every value would score the same
+        raise ValueError("Sweeping 'threshold' requires with_final (--with-final)")
+    digests = [file_digest(file_path) for file_path in files]
+    configs = [to_reward_config(params) for params in sweep]
+    keys = [result_key(config, digests, gamma, back, with_final) for config in configs]
+    cache = load_cache(cache_path) if cache_path else {}
+    todo = [i for i, key in enumerate(keys) if key not in cache]
+    print(f"{len(sweep)} configurations, {len(sweep) - len(todo)} cached, {len(todo)} to score")
+
+    if todo:
+        # Outcomes only depend on the data, the returns are scored in batches of configurations per store
+        outcomes = [episode_outcomes(read_trajectories(file_path)) for file_path in files]
+        touched = np.concatenate([touch.ravel() for touch, _ in outcomes])
+        won = np.concatenate([win.ravel() for _, win in outcomes])
+        batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+
+        with ProcessPoolExecutor(processes) as pool:
+            futures = {
+                (b, f): pool.submit(evaluate_store, file_path, [configs[i] for i in batch], gamma, back, with_final)
+                for b, batch in enumerate(batches) for f, file_path in enumerate(files)
+            }
+            for b, batch in enumerate(batches):
+                per_store = [futures[(b, f)].result() for f in range(len(files))]
+                entries = []
+                for j, i in enumerate(batch):
+                    returns = np.concatenate([store[j] for store in per_store])
+                    cache[keys[i]] = {"key": keys[i], "params": sweep[i], **summarize(returns, touched, won)}
+                    entries.append(json.dumps(cache[keys[i]]) + "\n")
+                if cache_path:
+                    # Written batch by batch, an interrupted sweep keeps what it finished
+                    with open(cache_path, "a") as cache_file:
+                        cache_file.writelines(entries)
+
+    return [cache[key] for key in keys]
+
+def format_result(result: dict) -> str:
+    params = " ".join(f"{name}={value:g}" for name, value in result["params"].items())
+    if result["episodes"] == 0:
+        return f"{params}: no episode"
+    return (f"{params}: episodes={result['episodes']} mean={result['mean']:.6f} std={result['std']:.6f} "
+            f"p50={result['p50']:.6f} p95={result['p95']:.6f} "
+            f"corr_touch={result['corr_touch']:.3f} corr_win={result['corr_win']:.3f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep the CustomReward weights over recorded kickoffs.")
+    parser.add_argument("files", nargs="+", help="Trajectory stores written by replay.py")
+    parser.add_argument("--param", action="append", default=[], help=f"name=v1,v2,... or name=low:high, name in {', '.join(PARAMETERS)}")
+    parser.add_argument("--samples", type=int, default=16, help="Draws of the ranges per grid point")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--back", type=int, default=0, help="Rewards kept at the end of every episode, the final reward excluded (0 keeps the whole episode)")
+    parser.add_argument("--with-final", action="store_true", help="Keep the final reward at the end of every episode")
+    parser.add_argument("--gamma", type=float, default=GAMMA)
+    parser.add_argument("--processes", type=int, default=None, help="Pool size (default: number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Configurations scored per pass over a store")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="Results cache, empty to disable (default: %(default)s)")
+    parser.add_argument("--sort", choices=("mean", "corr_touch", "corr_win"), default=None, help="Sort the results by this statistic")
+    args = parser.parse_args(argv)
+
+    grid, ranges = parse_params(args.param)
+    sweep = make_sweep(grid, ranges, args.samples, args.seed)
+    results = run_sweep(args.files, sweep, args.gamma, args.back, args.with_final, args.processes, args.batch_size,
+                        args.cache)
+    if args.sort:
+        results = sorted(results, key=lambda result: -np.nan_to_num(result.get(args.sort, np.nan), nan=-np.inf))
+    for result in results:
+        print(format_result(result))
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,23 @@ from rlgym.utils.gamestates import GameState
 from rlgym.utils.terminal_conditions import TerminalCondition
 from rlgym.utils.terminal_conditions.common_conditions import TimeoutCondition
 
+KICKOFF_RADIUS = 1200
+KICKOFF_TIMEOUT_SECONDS = 4.35
+
 class KickoffTerminalCondition(TerminalCondition):
-  def __init__(self, fps: int):
+  def __init__(self, fps: int, radius: float = KICKOFF_RADIUS, timeout_seconds: float = KICKOFF_TIMEOUT_SECONDS):
     super().__init__()
 
-    self.radius = 1200**2
+    self.radius = radius**2
 
     self.fps = fps
-    self.timeoutCondition = 4.35 # 4.5 seconds and we reset the game. Needed for kickoff terminal condition
+    self.timeoutCondition = timeout_seconds # 4.5 seconds and we reset the game. Needed for kickoff terminal condition
     self.timeoutCondition = TimeoutCondition(int(round(self.fps * self.timeoutCondition)))
 
   def reset(self, initial_state: GameState):
     self.timeoutCondition.reset(initial_state)
     return
-  
+
   def is_terminal(self, current_state: GameState) -> bool:
     # ===============================
     # - Ball outside the circle of 1200 radius: (x^2 + y^2) > r^2
@@ -27,5 +30,5 @@ class KickoffTerminalCondition(TerminalCondition):
     # Check if the ball is outside the radius or timeout condition is met
     if (ball_x**2 + ball_y**2 > self.radius) or (self.timeoutCondition.is_terminal(current_state)):
         return True
-        
+
     return False
@@ -1,18 +1,29 @@
+import functools
+
 import numpy as np
 
 #import rlgym
 import rlgym_sim as rlgym
 
-from rlgym.utils.action_parsers import DiscreteAction
-from rlgym.utils.obs_builders import DefaultObs
 from rlgym.utils.state_setters import DefaultState  # state at which each match starts (score = 0-0, time = 0:00, etc.)
 from rlgym_ppo import Learner
 
+from action_parser import LookupTableAction
 from logger import Logger
+from obs_builder import BatchDefaultObs
+from profiler import ProfiledActionParser, ProfiledObsBuilder, ProfiledReward, ProfiledTerminalCondition
+from replay import TrajectoryRecorder
 from reward import CustomReward
 from termination import KickoffTerminalCondition
 
-def makeEnvironment():
+# Report the per-component reward counters to wandb (reward/* charts)
+REWARD_TELEMETRY = False
+# Time the terminal, reward, obs and action stages of every step and report them to wandb (profile/* charts)
+PROFILE = False
+# Folder where every worker records the states it plays, to re-score them offline with replay.py. None to disable
+RECORD_TRAJECTORIES = None
+
+def makeEnvironment(profile=False):
 
     # RLGym tick settings
     game_tick_rate = 120
@@ -26,11 +37,21 @@ def makeEnvironment():
     # RLGym match settings
     spawn_opponents = True
     team_size = 1
-    action_parser = DiscreteAction()
+    action_parser = LookupTableAction()
     terminal_conditions = KickoffTerminalCondition(fps=fps)
-    reward_fn = CustomReward(gamma=gamma)
+    reward_fn = CustomReward(gamma=gamma, telemetry=REWARD_TELEMETRY)
     state_setter = DefaultState()
-    obs_builder = DefaultObs()
+    obs_builder = BatchDefaultObs(preallocate=True)
+
+    if RECORD_TRAJECTORIES is not None:
+        n_cars = team_size * 2 if spawn_opponents else team_size
+        reward_fn = TrajectoryRecorder(reward_fn, RECORD_TRAJECTORIES, n_cars, metadata={"gamma": gamma, "tick_skip": tick_skip})
+
+    if profile:
+        action_parser = ProfiledActionParser(action_parser)
+        terminal_conditions = ProfiledTerminalCondition(terminal_conditions)
+        reward_fn = ProfiledReward(reward_fn)
+        obs_builder = ProfiledObsBuilder(obs_builder)
 
     # For directly having ticks
     timeout_seconds = 6 # As per timeout condition in termination.py
@@ -47,7 +68,7 @@ def makeEnvironment():
     return env
 
 if __name__ == "__main__":
-    metrics_logger = Logger()
+    metrics_logger = Logger(reward_telemetry=REWARD_TELEMETRY, profile=PROFILE)
 
     # RLGym-PPO gamma calculation
     game_tick_rate = 120
@@ -64,7 +85,9 @@ if __name__ == "__main__":
     # educated guess - could be slightly higher or lower
     min_inference_size = max(1, int(round(n_proc * 0.9)))
 
-    learner = Learner(makeEnvironment,
+    build_env_fn = functools.partial(makeEnvironment, profile=PROFILE)
+
+    learner = Learner(build_env_fn,
                       n_proc=n_proc,
                       ppo_epochs=1,
                       ppo_batch_size=50_000,